@@ -9,12 +9,22 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from contextlib import asynccontextmanager
+from datetime import datetime
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from pathlib import Path
 
 from src.core.config import settings
 from src.core.database import db
-from src.api import auth, materials, quiz, progress, admin
+from src.core.security import password_hasher
+from src.api import auth, materials, quiz, progress, admin, jobs
+from src.services.question_index import question_index
+from src.services.quiz_service import quiz_service
+from src.services.explanation_pregenerator import explanation_pregenerator
+from src.services.material_processing import material_processor
+from src.services.upload_service import upload_service
+from src.services.file_reconciler import file_reconciler
+from src.services.progress_buffer import progress_buffer
+from src.services.job_service import job_service
 
 # Initialize scheduler
 scheduler = AsyncIOScheduler()
@@ -24,11 +34,61 @@ async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
     db.connect()
+    await db.ensure_indexes()
+    await question_index.refresh()
+    scheduler.add_job(
+        question_index.refresh,
+        "interval",
+        seconds=settings.QUESTION_INDEX_REFRESH_SECONDS,
+        id="question_index_refresh"
+    )
+    if settings.PREGEN_ENABLED:
+        scheduler.add_job(
+            explanation_pregenerator.run,
+            "interval",
+            minutes=settings.PREGEN_INTERVAL_MINUTES,
+            id="explanation_pregeneration",
+            max_instances=1,
+            coalesce=True
+        )
+    scheduler.add_job(
+        upload_service.purge_expired,
+        "interval",
+        hours=1,
+        id="upload_session_purge",
+        max_instances=1,
+        coalesce=True
+    )
+    scheduler.add_job(
+        progress_buffer.flush,
+        "interval",
+        seconds=settings.PROGRESS_FLUSH_INTERVAL_SECONDS,
+        id="progress_buffer_flush",
+        max_instances=1,
+        coalesce=True
+    )
+    scheduler.add_job(
+        file_reconciler.run,
+        "interval",
+        minutes=settings.FILE_RECONCILE_INTERVAL_MINUTES,
+        id="file_reconciler",
+        next_run_time=datetime.now(),
+        max_instances=1,
+        coalesce=True
+    )
     scheduler.start()
+    await material_processor.resume_pending()
+    await job_service.resume_pending()
     print(f"✅ {settings.APP_NAME} v{settings.APP_VERSION} started")
     yield
     # Shutdown
     scheduler.shutdown()
+    # Buffered progress writes reach MongoDB before the connection closes
+    await progress_buffer.shutdown()
+    await job_service.shutdown()
+    await material_processor.shutdown()
+    await quiz_service.embedding_batcher.stop()
+    password_hasher.shutdown()
     db.disconnect()
     print("👋 Application shutdown")
 
@@ -54,6 +114,7 @@ app.include_router(materials.router, prefix="/api/materials")
 app.include_router(quiz.router, prefix="/api/questions")
 app.include_router(progress.router, prefix="/api/progress")
 app.include_router(admin.router, prefix="/api/admin")
+app.include_router(jobs.router, prefix="/api/jobs")
 
 # Ensure required directories exist
 Path("frontend-react/dist/assets").mkdir(parents=True, exist_ok=True)
@@ -7,6 +7,9 @@ import axios from 'axios';
 pdfjsLib.GlobalWorkerOptions.workerSrc = 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/5.4.394/pdf.worker.mjs';
 
 const API_BASE = `${window.location.origin}/api`;
+// Page marks are debounced and sent with reading-time heartbeats via POST /progress/batch
+const FLUSH_DEBOUNCE_MS = 1500;
+const HEARTBEAT_MS = 15000;
 
 export default function PdfViewer({ material, token }) {
   const canvasRef = useRef(null);
@@ -27,8 +30,69 @@ export default function PdfViewer({ material, token }) {
     ? `${API_BASE}/materials/${material.id}/file`
     : null;
 
+  const pendingRef = useRef({ pages: new Set(), seconds: 0 });
+  const lastTickRef = useRef(Date.now());
+  const pageRef = useRef(1);
+  const flushTimerRef = useRef(null);
+
   useEffect(() => { fetchProgress(); }, []);
 
+  function takePending() {
+    const now = Date.now();
+    if (document.visibilityState === 'visible') {
+      pendingRef.current.seconds += (now - lastTickRef.current) / 1000;
+    }
+    lastTickRef.current = now;
+    const { pages, seconds } = pendingRef.current;
+    pendingRef.current = { pages: new Set(), seconds: 0 };
+    return {
+      material_id: material.id,
+      completed_pages: [...pages],
+      reading_seconds: Math.min(Math.round(seconds * 10) / 10, 3600),
+      current_page: pageRef.current
+    };
+  }
+
+  async function flushProgress({ keepalive = false } = {}) {
+    clearTimeout(flushTimerRef.current);
+    flushTimerRef.current = null;
+    const item = takePending();
+    if (!item.completed_pages.length && item.reading_seconds < 1) return;
+    const body = JSON.stringify({ items: [item] });
+    const headers = { 'Content-Type': 'application/json', Authorization: `Bearer ${token}` };
+    try {
+      if (keepalive) {
+        // Survives page unload (sendBeacon cannot carry the Authorization header)
+        fetch(`${API_BASE}/progress/batch`, { method: 'POST', body, headers, keepalive: true });
+        return;
+      }
+      await axios.post(`${API_BASE}/progress/batch`, body, { headers });
+    } catch (e) {
+      // Put the marks back so the next flush retries them
+      item.completed_pages.forEach(p => pendingRef.current.pages.add(p));
+      console.warn('Progress flush failed', e);
+    }
+  }
+
+  function scheduleFlush() {
+    if (flushTimerRef.current) return;
+    flushTimerRef.current = setTimeout(() => flushProgress(), FLUSH_DEBOUNCE_MS);
+  }
+
+  useEffect(() => {
+    const heartbeat = setInterval(() => flushProgress(), HEARTBEAT_MS);
+    const onHide = () => { if (document.visibilityState === 'hidden') flushProgress({ keepalive: true }); };
+    const onPageHide = () => flushProgress({ keepalive: true });
+    document.addEventListener('visibilitychange', onHide);
+    window.addEventListener('pagehide', onPageHide);
+    return () => {
+      clearInterval(heartbeat);
+      document.removeEventListener('visibilitychange', onHide);
+      window.removeEventListener('pagehide', onPageHide);
+      flushProgress({ keepalive: true });
+    };
+  }, [material.id, token]);
+
   async function fetchProgress() {
     try {
       const res = await axios.get(`${API_BASE}/progress/${material.id}`, { headers:{ Authorization:`Bearer ${token}` } });
@@ -89,6 +153,7 @@ export default function PdfViewer({ material, token }) {
     await page.render({ canvasContext: ctx, viewport }).promise;
     setStatus('');
     setPageNum(num);
+    pageRef.current = num;
     if(!initial){ localStorage.setItem(`pdf_last_page_${material.id}`, String(num)); }
   }
 
@@ -99,16 +164,22 @@ export default function PdfViewer({ material, token }) {
   function zoomOut(){ setScale(s => { const ns = Math.max(s - 0.15, 0.5); renderPage(pageNum); return ns; }); }
   function toggleFullscreen(){ setFullscreen(f => !f); }
 
-  async function markPageComplete(){
+  function markPageComplete(){
     if(!pageNum) return;
-    try {
-      await axios.put(`${API_BASE}/progress/${material.id}/page/${pageNum}`, null, { headers:{ Authorization:`Bearer ${token}` } });
-      fetchProgress();
-    } catch(e){ console.warn('Mark page failed', e); }
+    pendingRef.current.pages.add(pageNum);
+    // Optimistic update; the batch is written server-side within a couple of seconds
+    setProgress(p => {
+      const pages = new Set(p?.completed_pages || []);
+      pages.add(pageNum);
+      const pct = total ? Math.round(pages.size / total * 10000) / 100 : (p?.progress_percentage ?? 0);
+      return { ...(p || {}), completed_pages: [...pages].sort((a, b) => a - b), progress_percentage: pct };
+    });
+    scheduleFlush();
   }
 
   async function markMaterialComplete(){
     try {
+      await flushProgress();
       await axios.put(`${API_BASE}/progress/${material.id}/complete`, null, { headers:{ Authorization:`Bearer ${token}` } });
       fetchProgress();
     } catch(e){ console.warn('Complete failed', e); }
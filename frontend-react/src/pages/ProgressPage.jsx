@@ -5,7 +5,7 @@ const API_BASE = `${window.location.origin}/api`;
 
 export default function ProgressPage(){
   const { token } = useAuth();
-  const [materials, setMaterials] = useState([]);
+  const [items, setItems] = useState([]);
   const [loading, setLoading] = useState(true);
 
   useEffect(()=>{ if(token){ load(); } }, [token]);
@@ -13,48 +13,40 @@ export default function ProgressPage(){
   async function load(){
     setLoading(true);
     try {
-      const res = await axios.get(`${API_BASE}/materials/enrolled`, { headers:{ Authorization:`Bearer ${token}` } });
-      setMaterials(res.data);
+      // One request: every progress record with its material's title/metadata
+      const res = await axios.get(`${API_BASE}/progress`, { headers:{ Authorization:`Bearer ${token}` } });
+      setItems(res.data.items.filter(p => p.material));
     } catch(e){ console.error(e); } finally { setLoading(false); }
   }
 
-  async function refreshProgress(id){
-    // placeholder for future granular refresh
-    load();
-  }
-
   return (
     <div style={{ background:'#ffffff', borderRadius:'20px', padding:'2rem', boxShadow:'0 4px 20px rgba(0,0,0,0.08)', minHeight:'calc(100vh - 4rem)' }}>
       <h2 style={title}>📈 My Progress</h2>
       {loading && <div>Loading...</div>}
-      {!loading && materials.length===0 && <div>No enrolled materials.</div>}
+      {!loading && items.length===0 && <div>No enrolled materials.</div>}
       <div style={grid}>
-        {materials.map(m => (
-          <MaterialProgress key={m.id} material={m} token={token} onUpdate={()=>refreshProgress(m.id)} />
+        {items.map(p => (
+          <MaterialProgress key={p.material_id} progress={p} token={token} onUpdate={load} />
         ))}
       </div>
     </div>
   );
 }
 
-function MaterialProgress({ material, token, onUpdate }){
-  const [progress, setProgress] = useState(null);
-  const API_BASE = `${window.location.origin}/api`;
-  useEffect(()=>{ load(); }, []);
-  async function load(){ try { const res= await axios.get(`${API_BASE}/progress/${material.id}`, { headers:{ Authorization:`Bearer ${token}` } }); setProgress(res.data); } catch(e){ } }
+function MaterialProgress({ progress, token, onUpdate }){
+  const material = progress.material;
 
   async function markPage(){
-    if(!progress || !progress.completed_pages) return;
     // naive next page assumption
-    const next = progress.completed_pages.length + 1;
-    try { await axios.put(`${API_BASE}/progress/${material.id}/page/${next}`, null, { headers:{ Authorization:`Bearer ${token}` } }); load(); onUpdate(); } catch(e){ alert('Mark page failed'); }
+    const next = (progress.completed_pages_count || 0) + 1;
+    try { await axios.put(`${API_BASE}/progress/${material.id}/page/${next}`, null, { headers:{ Authorization:`Bearer ${token}` } }); onUpdate(); } catch(e){ alert('Mark page failed'); }
   }
 
   async function markComplete(){
-    try { await axios.put(`${API_BASE}/progress/${material.id}/complete`, null, { headers:{ Authorization:`Bearer ${token}` } }); load(); onUpdate(); } catch(e){ alert('Complete failed'); }
+    try { await axios.put(`${API_BASE}/progress/${material.id}/complete`, null, { headers:{ Authorization:`Bearer ${token}` } }); onUpdate(); } catch(e){ alert('Complete failed'); }
   }
 
-  const pct = progress?.progress_percentage || 0;
+  const pct = progress.progress_percentage || 0;
   return (
     <div style={card}>
       <div style={{ display:'flex', justifyContent:'space-between' }}>
@@ -62,7 +54,7 @@ function MaterialProgress({ material, token, onUpdate }){
         <div style={{ fontSize:'0.7rem', color:'#718096' }}>{pct}%</div>
       </div>
       <div style={barOuter}><div style={{ ...barInner, width:`${pct}%` }} /></div>
-      <div style={{ fontSize:'0.6rem', color:'#4a5568', marginBottom:'.5rem' }}>{progress?.completed_pages?.length || 0} pages completed</div>
+      <div style={{ fontSize:'0.6rem', color:'#4a5568', marginBottom:'.5rem' }}>{progress.completed_pages_count || 0} pages completed</div>
       <div style={{ display:'flex', gap:'.4rem' }}>
         <button style={btnPrimary} onClick={markPage}>Mark Page</button>
         <button style={btnSecondary} onClick={markComplete}>Complete</button>
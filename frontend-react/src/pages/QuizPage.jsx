@@ -70,17 +70,40 @@ export default function QuizPage(){
     try {
       const res = await axios.post(`${API_BASE}/questions/answer`, { 
         question_id: question.question_id, 
-        user_answer: selected 
+        user_answer: selected,
+        explanation_mode: 'deferred'
       }, { 
         headers:{ Authorization:`Bearer ${token}` } 
       });
       setResult(res.data);
       saveStats(res.data.correct);
+      if(res.data.explanation_ticket){
+        pollExplanation(res.data.explanation_ticket);
+      }
     } catch(e){ 
       alert('Submit failed'); 
     }
   }
 
+  // Grading returns immediately; the LLM explanation arrives via its ticket
+  async function pollExplanation(ticket, attempt = 0){
+    try {
+      const res = await axios.get(`${API_BASE}/questions/explanations/${ticket}`, {
+        headers:{ Authorization:`Bearer ${token}` }
+      });
+      if(res.data.status !== 'pending'){
+        setResult(r => r && r.explanation_ticket === ticket ? { ...r, explanation: res.data.explanation, explanation_status: res.data.status } : r);
+        return;
+      }
+    } catch(e){
+      console.warn('Explanation poll failed', e);
+      return;
+    }
+    if(attempt < 60){
+      setTimeout(() => pollExplanation(ticket, attempt + 1), 1000);
+    }
+  }
+
   function nextQuestion(){
     setResult(null); 
     setSelected(null); 
@@ -259,6 +282,15 @@ export default function QuizPage(){
                 </p>
               </div>
               
+              {!result.explanation && result.explanation_status === 'pending' && (
+                <div style={styles.explanation}>
+                  <div style={styles.explanationHeader}>
+                    <i className="fas fa-circle-notch fa-spin" style={{ marginRight:'0.5rem' }}></i>
+                    Generating explanation...
+                  </div>
+                </div>
+              )}
+              
               {result.explanation && (
                 <div style={styles.explanation}>
                   <div style={styles.explanationHeader}>
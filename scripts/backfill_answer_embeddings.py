@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Precompute answer embeddings for fill-in questions that lack them for the
+configured EMBEDDING_MODEL (e.g. after importing questions directly into
+MongoDB or switching models).
+
+Usage:
+    python scripts/backfill_answer_embeddings.py
+"""
+import os
+os.environ["USE_TF"] = "0"
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.core.database import db
+from src.services.quiz_service import quiz_service
+
+async def run():
+    db.connect()
+    try:
+        updated = await quiz_service.backfill_answer_embeddings()
+        print(f"✅ Answer embeddings computed for {updated} question(s) ({quiz_service.embedding_model})")
+    finally:
+        db.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(run())
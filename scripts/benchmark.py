@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Login-storm benchmark: measures latency of an unrelated endpoint while many
+clients log in concurrently.
+
+Usage:
+    python scripts/benchmark.py --email user@example.com --password Secret123
+
+Runs two phases against a live server: a quiet baseline, then the same probe
+while ``--storm-clients`` threads hammer POST /api/auth/login. Reports p50/p95/p99
+probe latency for both phases plus login throughput. Only successful (2xx)
+requests count as completed; rejections (e.g. 503) and connection errors are
+reported separately and excluded from latencies and throughput.
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of floats"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def request(url, payload=None, timeout=30):
+    """Issue a request and return the HTTP status code, or None on a connection error/timeout"""
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return None
+
+def succeeded(status):
+    return status is not None and 200 <= status < 300
+
+def probe(url, duration, interval):
+    """Hit the probe endpoint sequentially; returns (latencies in ms of successful requests, failures)"""
+    latencies, failures = [], 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        status = request(url)
+        if succeeded(status):
+            latencies.append((time.perf_counter() - start) * 1000)
+        else:
+            failures += 1
+        time.sleep(interval)
+    return latencies, failures
+
+def login_storm(url, credentials, stop_event, counters, lock):
+    """Log in repeatedly until told to stop"""
+    while not stop_event.is_set():
+        status = request(url, credentials)
+        key = "error" if status is None else status
+        with lock:
+            counters[key] = counters.get(key, 0) + 1
+
+def summarize(name, latencies, failures):
+    print(f"{name:<10} n={len(latencies):<6} failed={failures:<5} "
+          f"p50={percentile(latencies, 50):8.1f}ms "
+          f"p95={percentile(latencies, 95):8.1f}ms "
+          f"p99={percentile(latencies, 99):8.1f}ms "
+          f"max={max(latencies, default=0):8.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Probe endpoint latency during a login storm")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--email", required=True, help="Existing account used for the storm")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--probe-path", default="/api/health")
+    parser.add_argument("--storm-clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per phase")
+    parser.add_argument("--probe-interval", type=float, default=0.02)
+    args = parser.parse_args()
+
+    probe_url = args.base_url.rstrip("/") + args.probe_path
+    login_url = args.base_url.rstrip("/") + "/api/auth/login"
+    credentials = {"email": args.email, "password": args.password}
+
+    print(f"Baseline: probing {probe_url} for {args.duration}s")
+    baseline, baseline_failures = probe(probe_url, args.duration, args.probe_interval)
+
+    print(f"Storm: {args.storm_clients} clients logging in for {args.duration}s")
+    stop_event = threading.Event()
+    counters, lock = {}, threading.Lock()
+    workers = [
+        threading.Thread(target=login_storm, args=(login_url, credentials, stop_event, counters, lock), daemon=True)
+        for _ in range(args.storm_clients)
+    ]
+    for w in workers:
+        w.start()
+    storm, storm_failures = probe(probe_url, args.duration, args.probe_interval)
+    stop_event.set()
+    for w in workers:
+        w.join(timeout=30)
+
+    print("=" * 72)
+    summarize("baseline", baseline, baseline_failures)
+    summarize("storm", storm, storm_failures)
+    completed = sum(n for status, n in counters.items() if status != "error" and succeeded(status))
+    failed = sum(counters.values()) - completed
+    print(f"logins: {completed} completed ({completed / args.duration:.1f}/s), {failed} failed; "
+          f"by status: {counters}")
+
+if __name__ == "__main__":
+    main()
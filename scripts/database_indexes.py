@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Create the MongoDB indexes declared in src/core/database.py and audit query plans.
+
+Usage:
+    python scripts/database_indexes.py            # create indexes
+    python scripts/database_indexes.py --audit    # create, then fail on any COLLSCAN
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.core.database import db
+
+async def run(audit: bool) -> int:
+    db.connect()
+    try:
+        report = await db.ensure_indexes()
+        failed = False
+        for index, status in report.items():
+            print(f"{'✅' if status == 'ok' else '❌'} {index}: {status}")
+            failed = failed or status != "ok"
+        if audit:
+            print("")
+            for result in await db.audit_query_plans():
+                marker = "❌" if result["collscan"] else "✅"
+                print(f"{marker} {result['query']} [{result['collection']}]: {' <- '.join(result['stages'])}")
+                failed = failed or result["collscan"]
+        return 1 if failed else 0
+    finally:
+        db.disconnect()
+
+def main():
+    parser = argparse.ArgumentParser(description="Create indexes and audit query plans")
+    parser.add_argument("--audit", action="store_true", help="Explain each service query shape and fail on COLLSCAN")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.audit)))
+
+if __name__ == "__main__":
+    main()
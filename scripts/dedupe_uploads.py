@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Move uploads stored as uploads/materials/{material_id}_{filename} into the
+content-addressed blob store, so identical files are kept once, then recount
+blob references from the materials collection.
+
+Safe to re-run: legacy files are removed only after their material points at
+the blob, and refcounts are always recomputed at the end (blobs left with no
+references are then deleted).
+
+Usage:
+    python scripts/dedupe_uploads.py [--dry-run]
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import shutil
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.core.config import settings
+from src.core.database import db, get_materials_collection, get_blobs_collection
+from src.services.blob_store import blob_store
+
+def sha256_file(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def stage_copy(src: Path, dest: Path) -> None:
+    """Hard-link (or copy) so the legacy file survives until its material is repointed"""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+async def migrate(dry_run: bool) -> dict:
+    materials = get_materials_collection()
+    uploads_root = Path(settings.UPLOAD_DIR).parent
+    tmp_dir = Path(settings.UPLOAD_TMP_DIR)
+    report = {"migrated": 0, "missing": 0, "duplicates": 0, "bytes_reclaimed": 0}
+    seen = set()
+
+    cursor = materials.find(
+        {"file_path": {"$nin": [None, ""], "$not": {"$regex": "^blobs/"}}},
+        {"file_path": 1, "file_name": 1}
+    )
+    async for mat in cursor:
+        legacy = uploads_root / mat["file_path"]
+        if not legacy.exists():
+            report["missing"] += 1
+            continue
+        sha256 = await asyncio.to_thread(sha256_file, legacy)
+        size = legacy.stat().st_size
+        if sha256 in seen or await blob_store.get(sha256):
+            report["duplicates"] += 1
+            report["bytes_reclaimed"] += size
+        seen.add(sha256)
+        report["migrated"] += 1
+        if dry_run:
+            continue
+
+        ext = legacy.suffix.lower().lstrip(".") or "bin"
+        staged = tmp_dir / f"migrate_{mat['_id']}"
+        await asyncio.to_thread(stage_copy, legacy, staged)
+        blob_path = await blob_store.put(staged, sha256, ext, size)
+        prefix = f"{mat['_id']}_"
+        file_name = mat.get("file_name") or (legacy.name[len(prefix):] if legacy.name.startswith(prefix) else legacy.name)
+        await materials.update_one(
+            {"_id": mat["_id"]},
+            {"$set": {"file_path": blob_path, "file_name": file_name, "sha256": sha256, "file_size": size}}
+        )
+        legacy.unlink(missing_ok=True)
+
+    if not dry_run:
+        report["refcounts_fixed"] = await recount()
+        report["blobs_collected"] = await blob_store.collect_unreferenced()
+    return report
+
+async def recount() -> int:
+    """Set every blob's refcount to the number of materials that reference it"""
+    counts = {}
+    pipeline = [
+        {"$match": {"file_path": {"$regex": "^blobs/"}, "sha256": {"$ne": None}}},
+        {"$group": {"_id": "$sha256", "refs": {"$sum": 1}}}
+    ]
+    async for row in get_materials_collection().aggregate(pipeline):
+        counts[row["_id"]] = row["refs"]
+    fixed = 0
+    blobs = get_blobs_collection()
+    async for blob in blobs.find({}, {"refcount": 1}):
+        refs = counts.get(blob["_id"], 0)
+        if blob.get("refcount") != refs:
+            await blobs.update_one({"_id": blob["_id"]}, {"$set": {"refcount": refs}})
+            fixed += 1
+    return fixed
+
+async def run(dry_run: bool):
+    db.connect()
+    try:
+        report = await migrate(dry_run)
+        label = "Would migrate" if dry_run else "Migrated"
+        print(f"✅ {label} {report['migrated']} file(s); {report['duplicates']} duplicate(s), "
+              f"{report['bytes_reclaimed'] / 1_048_576:.1f} MB reclaimed")
+        if report["missing"]:
+            print(f"⚠️  {report['missing']} material(s) reference files missing on disk")
+        if "refcounts_fixed" in report:
+            print(f"   Blob refcounts corrected: {report['refcounts_fixed']}, "
+                  f"unreferenced blobs removed: {report['blobs_collected']}")
+    finally:
+        db.disconnect()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dry-run", action="store_true", help="report savings without moving files")
+    args = parser.parse_args()
+    asyncio.run(run(args.dry_run))
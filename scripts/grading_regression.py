@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Regression check for tiered fill-in grading.
+
+Grades every labeled case in scripts/data/grading_regression.jsonl twice:
+once with embedding similarity only (the original grader) and once with the
+lexical tiers in front. Fails if the two disagree on any case, and reports
+how often the lexical tiers avoided transformer inference.
+
+--lexical-only skips the embedding model and checks just the lexical tiers:
+they may only accept, so any case they accept must be labeled correct.
+
+Usage:
+    python scripts/grading_regression.py [--cases path/to/cases.jsonl] [--lexical-only]
+"""
+import os
+os.environ["USE_TF"] = "0"
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+def load_cases(cases_path: Path) -> list:
+    return [json.loads(line) for line in cases_path.read_text().splitlines() if line.strip()]
+
+def run_lexical(cases_path: Path) -> int:
+    # Loaded on its own: importing src.services loads the embedding model
+    spec = importlib.util.spec_from_file_location("answer_grader", ROOT / "src" / "services" / "answer_grader.py")
+    answer_grader = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(answer_grader)
+    from src.core.config import settings
+
+    grader = answer_grader.AnswerGrader(
+        max_edit_distance=settings.LEXICAL_MAX_EDIT_DISTANCE,
+        min_length_for_edits=settings.LEXICAL_MIN_LENGTH_FOR_EDITS
+    )
+    cases = load_cases(cases_path)
+    false_accepts = 0
+    for case in cases:
+        tier = grader.match(case["user_answer"], answer_grader.split_acceptable_answers(case["answer"]))
+        status = "ok"
+        if tier and not case["expected"]:
+            false_accepts += 1
+            status = "WRONG"
+        print(f"{status:<9} tier={tier or '-':<13} expected={case['expected']!s:<5} "
+              f"{case['user_answer']!r} vs {case['answer']!r}")
+    print("=" * 72)
+    print(f"cases={len(cases)} lexical accepts of incorrect answers={false_accepts}")
+    print(f"tier counters: {grader.stats()}")
+    return 1 if false_accepts else 0
+
+async def run(cases_path: Path) -> int:
+    from src.services.quiz_service import quiz_service
+
+    cases = load_cases(cases_path)
+    mismatches = 0
+    label_errors = 0
+    for i, case in enumerate(cases):
+        q = {
+            "question_id": f"regression-{i}",
+            "question_type": "fill",
+            "answer": case["answer"],
+        }
+        q["answer_embeddings"] = await quiz_service._encode_answers(case["answer"])
+        semantic = await quiz_service._grade_fill_in(q, case["user_answer"], use_lexical=False)
+        tiered = await quiz_service._grade_fill_in(q, case["user_answer"])
+        status = "ok"
+        if tiered != semantic:
+            mismatches += 1
+            status = "MISMATCH"
+        if semantic != case["expected"]:
+            label_errors += 1
+        print(f"{status:<9} semantic={semantic!s:<5} tiered={tiered!s:<5} expected={case['expected']!s:<5} "
+              f"{case['user_answer']!r} vs {case['answer']!r}")
+
+    await quiz_service.embedding_batcher.stop()
+    print("=" * 72)
+    print(f"cases={len(cases)} tier/semantic mismatches={mismatches} "
+          f"semantic grader vs label disagreements={label_errors}")
+    print(f"tier counters: {quiz_service.answer_grader.stats()}")
+    return 1 if mismatches else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare tiered and embedding-only grading verdicts")
+    parser.add_argument("--cases", type=Path, default=ROOT / "scripts" / "data" / "grading_regression.jsonl")
+    parser.add_argument("--lexical-only", action="store_true",
+                        help="check the lexical tiers against the labels without the embedding model")
+    args = parser.parse_args()
+    sys.exit(run_lexical(args.cases) if args.lexical_only else asyncio.run(run(args.cases)))
+
+if __name__ == "__main__":
+    main()
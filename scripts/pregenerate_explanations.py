@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Pre-generate LLM explanations for every option of every multiple-choice
+question, so MCQ grading never calls Ollama on the request path.
+
+Incremental and resumable: questions already explained for the current
+question text, options, answer, model and prompt version are skipped, so the
+command can be interrupted and rerun at any time.
+
+Usage:
+    python scripts/pregenerate_explanations.py [--limit N]
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.core.database import db
+from src.services.explanation_pregenerator import explanation_pregenerator
+
+async def run(limit):
+    db.connect()
+    try:
+        report = await explanation_pregenerator.run(limit=limit)
+        print(f"✅ processed={report['processed']} skipped={report['skipped']} failed={report['failed']}")
+        if report["stopped_early"]:
+            print("⚠️  Stopped early: LLM unavailable. Rerun to resume.")
+            return 1
+        return 0
+    finally:
+        db.disconnect()
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate MCQ option explanations")
+    parser.add_argument("--limit", type=int, default=None, help="Process at most N questions this run")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.limit)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Admin API routes (operational diagnostics)
+"""
+from fastapi import APIRouter, Depends
+from typing import List
+from src.core.database import db
+from src.core.models import User, QuestionCreate
+from src.core.security import password_hasher
+from src.services.auth_service import auth_service
+from src.services.question_index import question_index
+from src.services.quiz_service import quiz_service
+from src.services.explanation_cache import explanation_cache
+from src.services.llm_gateway import llm_gateway
+from src.services.file_reconciler import file_reconciler
+from src.services.progress_buffer import progress_buffer
+from src.services.job_service import job_service
+
+router = APIRouter(tags=["Admin"])
+
+@router.get("/metrics")
+async def get_metrics(current_user: User = Depends(auth_service.get_current_admin)):
+    """In-process cache and worker metrics for tuning"""
+    return {
+        "user_cache": auth_service.user_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "question_index": question_index.stats(),
+        "embedding_batcher": quiz_service.embedding_batcher.stats(),
+        "answer_grader": quiz_service.answer_grader.stats(),
+        "explanation_cache": explanation_cache.stats(),
+        "llm_gateway": llm_gateway.stats(),
+        "file_reconciler": file_reconciler.stats(),
+        "progress_buffer": progress_buffer.stats(),
+        "jobs": job_service.stats()
+    }
+
+@router.get("/indexes/audit")
+async def audit_indexes(current_user: User = Depends(auth_service.get_current_admin)):
+    """Explain every service query shape; ok is False if any falls back to COLLSCAN"""
+    results = await db.audit_query_plans()
+    return {
+        "ok": not any(r["collscan"] for r in results),
+        "queries": results
+    }
+
+@router.post("/files/reconcile")
+async def reconcile_files(current_user: User = Depends(auth_service.get_current_admin)):
+    """Refresh cached file flags on all materials now instead of waiting for the next run"""
+    return await file_reconciler.run()
+
+@router.post("/questions")
+async def import_questions(
+    questions: List[QuestionCreate],
+    current_user: User = Depends(auth_service.get_current_admin)
+):
+    """Create or bulk-import questions (answer embeddings are computed here, once)"""
+    question_ids = await quiz_service.create_questions(questions)
+    return {"imported": len(question_ids), "question_ids": question_ids}
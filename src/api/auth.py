@@ -10,12 +10,12 @@ router = APIRouter(tags=["Authentication"])
 @router.post("/register", response_model=User)
 async def register(user: UserCreate):
     """Register a new user"""
-    return auth_service.register_user(user)
+    return await auth_service.register_user(user)
 
 @router.post("/login", response_model=Token)
 async def login(credentials: UserLogin):
     """Login and get access token"""
-    return auth_service.login_user(credentials)
+    return await auth_service.login_user(credentials)
 
 @router.get("/me", response_model=User)
 async def get_current_user_profile(current_user: User = Depends(auth_service.get_current_user)):
@@ -0,0 +1,17 @@
+"""
+Background job API routes
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from src.core.models import User
+from src.services.auth_service import auth_service
+from src.services.job_service import job_service
+
+router = APIRouter(tags=["Jobs"])
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, current_user: User = Depends(auth_service.get_current_user)):
+    """Status and progress of a background job (its creator or an admin)"""
+    job = await job_service.get(job_id)
+    if not job or (job.get("created_by") != current_user.id and current_user.role != "admin"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,14 +1,20 @@
 """
 Materials API routes
 """
-from fastapi import APIRouter, Depends, File, UploadFile, Form, HTTPException, Response
+from fastapi import APIRouter, Depends, File, UploadFile, Form, HTTPException, Response, Request, Query
 from typing import List, Optional
-from src.core.models import Material, User
+from src.core.models import BulkEnrollment, Material, User, UploadSessionCreate
 from src.services.auth_service import auth_service
 from src.services.material_service import material_service
+from src.services.material_index import material_index
+from src.services.material_processing import material_processor
+from src.services.upload_service import upload_service
 from pathlib import Path
 import mimetypes
 from src.core.config import settings
+from src.utils.sse import sse_event, SSE_HEADERS
+from src.utils.http_files import file_response
+from fastapi.responses import StreamingResponse
 
 router = APIRouter(tags=["Materials"])
 
@@ -23,7 +29,7 @@ async def upload_material(
     current_user: User = Depends(auth_service.get_current_user)
 ):
     """Upload a new learning material"""
-    return material_service.create_material(
+    material = await material_service.create_material(
         title=title,
         description=description,
         department=department,
@@ -32,6 +38,71 @@ async def upload_material(
         file=file,
         content=content
     )
+    # Page count, text extraction, hashing, thumbnail and retrieval index run in the background
+    material_processor.enqueue(material.id)
+    return material
+
+@router.post("/uploads")
+async def create_upload_session(
+    session: UploadSessionCreate,
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """Start a resumable upload (for large videos); send bytes with PUT /uploads/{upload_id}?offset=N"""
+    return await upload_service.create_session(current_user.id, session.filename, session.total_size)
+
+@router.get("/uploads/{upload_id}")
+async def get_upload_session(
+    upload_id: str,
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """Resumable upload state; received_bytes is the offset to resume from"""
+    return await upload_service.get_session(upload_id, current_user.id)
+
+@router.put("/uploads/{upload_id}")
+async def upload_part(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """Append the raw request body at offset (streamed to disk, never buffered whole)"""
+    content_length = request.headers.get("content-length")
+    return await upload_service.append(
+        upload_id,
+        current_user.id,
+        offset,
+        request.stream(),
+        int(content_length) if content_length and content_length.isdigit() else None
+    )
+
+@router.post("/uploads/{upload_id}/complete", response_model=Material)
+async def complete_upload(
+    upload_id: str,
+    title: str = Form(...),
+    description: str = Form(...),
+    department: str = Form(...),
+    content_type: str = Form(...),
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """Turn a fully received resumable upload into a material"""
+    material = await material_service.create_material(
+        title=title,
+        description=description,
+        department=department,
+        content_type=content_type,
+        user_id=current_user.id,
+        upload_id=upload_id
+    )
+    material_processor.enqueue(material.id)
+    return material
+
+@router.delete("/uploads/{upload_id}")
+async def abort_upload(
+    upload_id: str,
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """Abandon a resumable upload and discard its partial file"""
+    return await upload_service.abort(upload_id, current_user.id)
 
 @router.get("", response_model=List[Material])
 async def get_materials(
@@ -39,12 +110,12 @@ async def get_materials(
     current_user: User = Depends(auth_service.get_current_user)
 ):
     """Get all materials, optionally filtered by department"""
-    return material_service.get_materials(department)
+    return await material_service.get_materials(department)
 
 @router.get("/enrolled", response_model=List[Material])
 async def get_enrolled_materials(current_user: User = Depends(auth_service.get_current_user)):
     """Get materials the user is enrolled in"""
-    return material_service.get_enrolled_materials(current_user)
+    return await material_service.get_enrolled_materials(current_user)
 
 @router.get("/{material_id}")
 async def get_material(
@@ -52,31 +123,40 @@ async def get_material(
     current_user: User = Depends(auth_service.get_current_user)
 ):
     """Get a specific material by ID"""
-    material = material_service.get_material_by_id(material_id)
+    material = await material_service.get_material_by_id(material_id)
     if not material:
         raise HTTPException(status_code=404, detail="Material not found")
     return {**material, "id": material["_id"]}
 
-@router.get("/{material_id}/file")
-async def get_material_file(
+@router.get("/{material_id}/status")
+async def get_material_status(
     material_id: str,
     current_user: User = Depends(auth_service.get_current_user)
 ):
-    """Serve the raw file for a material with correct MIME type (inline)."""
-    material = material_service.get_material_by_id(material_id)
-    if not material or not material.get("file_path"):
-        raise HTTPException(status_code=404, detail="File not found for material")
-
-    # material['file_path'] stored as 'materials/<filename>' relative to uploads root
-    uploads_root = Path(settings.UPLOAD_DIR).parent  # 'uploads'
-    file_rel = material["file_path"]  # e.g. materials/abc.pdf
-    file_abs = uploads_root / file_rel
-    if not file_abs.exists():
-        raise HTTPException(status_code=404, detail="Stored file missing on disk")
+    """Background processing status (queued, processing, ready or failed)"""
+    return await material_service.get_processing_status(material_id)
 
+async def _serve_material_file(material_id: str, request: Request):
+    material, file_abs, st = await material_service.resolve_material_file(material_id)
     media_type = mimetypes.guess_type(str(file_abs.name))[0] or "application/octet-stream"
-    from fastapi.responses import FileResponse
-    return FileResponse(str(file_abs), media_type=media_type, headers={"Accept-Ranges": "bytes"})
+    return file_response(
+        request,
+        str(file_abs),
+        st,
+        media_type,
+        etag=material_service.file_etag(material, st),
+        filename=material.get("file_name")
+    )
+
+@router.get("/{material_id}/file")
+async def get_material_file(
+    material_id: str,
+    request: Request,
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """Serve the raw file for a material with correct MIME type (inline).
+    Supports ETag/Last-Modified revalidation (304) and single or multiple byte ranges."""
+    return await _serve_material_file(material_id, request)
 
 @router.get("/{material_id}/file-info")
 async def get_material_file_info(
@@ -84,65 +164,16 @@ async def get_material_file_info(
     current_user: User = Depends(auth_service.get_current_user)
 ):
     """Return diagnostic info about the stored file (size, hash, header bytes)."""
-    import hashlib
-    material = material_service.get_material_by_id(material_id)
-    if not material or not material.get("file_path"):
-        raise HTTPException(status_code=404, detail="File not found for material")
-
-    uploads_root = Path(settings.UPLOAD_DIR).parent
-    file_rel = material["file_path"]
-    file_abs = uploads_root / file_rel
-    if not file_abs.exists():
-        raise HTTPException(status_code=404, detail="Stored file missing on disk")
-
-    data = {
-        "material_id": material_id,
-        "file_name": file_abs.name,
-        "file_path": str(file_abs),
-        "size_bytes": file_abs.stat().st_size,
-        "is_pdf": file_abs.suffix.lower() == ".pdf",
-    }
-    # Hash (MD5 for quick diagnostic purposes, not for security)
-    hash_md5 = hashlib.md5()
-    with open(file_abs, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            hash_md5.update(chunk)
-    data["md5"] = hash_md5.hexdigest()
-    # First 8 bytes
-    with open(file_abs, "rb") as f:
-        header = f.read(8)
-    data["header_hex"] = header.hex()
-    data["header_ascii"] = ''.join(chr(b) if 32 <= b <= 126 else '.' for b in header)
-    # Expected PDF header starts with %PDF
-    if data["is_pdf"]:
-        data["pdf_header_valid"] = header.startswith(b"%PDF")
-    return data
+    return await material_service.get_file_info(material_id)
 
 @router.get("/{material_id}/file-stream")
 async def stream_material_file(
     material_id: str,
+    request: Request,
     current_user: User = Depends(auth_service.get_current_user)
 ):
     """Alternate streaming endpoint to add explicit headers helpful for some viewers."""
-    material = material_service.get_material_by_id(material_id)
-    if not material or not material.get("file_path"):
-        raise HTTPException(status_code=404, detail="File not found for material")
-    uploads_root = Path(settings.UPLOAD_DIR).parent
-    file_rel = material["file_path"]
-    file_abs = uploads_root / file_rel
-    if not file_abs.exists():
-        raise HTTPException(status_code=404, detail="Stored file missing on disk")
-    media_type = mimetypes.guess_type(str(file_abs.name))[0] or "application/octet-stream"
-    from fastapi.responses import FileResponse
-    # Provide Accept-Ranges and Cache-Control (adjust as needed)
-    return FileResponse(
-        str(file_abs),
-        media_type=media_type,
-        headers={
-            "Accept-Ranges": "bytes",
-            "Cache-Control": "no-store",
-        }
-    )
+    return await _serve_material_file(material_id, request)
 
 @router.put("/{material_id}/enroll")
 async def enroll_in_material(
@@ -150,7 +181,16 @@ async def enroll_in_material(
     current_user: User = Depends(auth_service.get_current_user)
 ):
     """Enroll in a material"""
-    return material_service.enroll_user(material_id, current_user)
+    return await material_service.enroll_user(material_id, current_user)
+
+@router.post("/{material_id}/enroll/bulk", status_code=202)
+async def bulk_enroll(
+    material_id: str,
+    cohort: BulkEnrollment,
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """Enroll a department or a list of users (uploader or admin); poll /api/jobs/{job_id}"""
+    return await material_service.bulk_enroll(material_id, cohort, current_user)
 
 @router.delete("/{material_id}")
 async def delete_material(
@@ -158,7 +198,7 @@ async def delete_material(
     current_user: User = Depends(auth_service.get_current_user)
 ):
     """Delete a material (must be uploader)."""
-    return material_service.delete_material(material_id, current_user)
+    return await material_service.delete_material(material_id, current_user)
 
 @router.delete("/{material_id}/force")
 async def force_delete_material(
@@ -167,7 +207,7 @@ async def force_delete_material(
 ):
     """Force delete a ghost material (missing file). Allows non-uploader if file is gone and user is enrolled.
     Prevent deletion via this route if file still exists."""
-    material = material_service.get_material_by_id(material_id)
+    material = await material_service.get_material_by_id(material_id)
     if not material:
         raise HTTPException(status_code=404, detail="Material not found")
     file_rel = material.get("file_path")
@@ -179,7 +219,7 @@ async def force_delete_material(
     # Authorization: uploader OR enrolled user may force delete ghost
     if material.get("uploaded_by") != current_user.id and material_id not in (current_user.enrolled_materials or []):
         raise HTTPException(status_code=403, detail="Not authorized to force delete this ghost material")
-    return material_service.force_delete_material(material_id)
+    return await material_service.force_delete_material(material_id, current_user)
 
 @router.post("/{material_id}/verify-learning")
 async def verify_learning(
@@ -188,7 +228,28 @@ async def verify_learning(
 ):
     """Verify learning for a material using AI"""
     from src.services.ai_service import ai_service
-    material = material_service.get_material_by_id(material_id)
+    material = await material_service.get_material_by_id(material_id)
+    if not material:
+        raise HTTPException(status_code=404, detail="Material not found")
+    context = await material_index.verification_context(material)
+    return await ai_service.verify_learning(material, context)
+
+@router.post("/{material_id}/verify-learning/stream")
+async def verify_learning_stream(
+    material_id: str,
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """Server-Sent Events: 'token' events as the assessment is generated, then
+    'result' with the parsed {understanding_level, assessment, recommendations, verified}."""
+    from src.services.ai_service import ai_service
+    material = await material_service.get_material_by_id(material_id)
     if not material:
         raise HTTPException(status_code=404, detail="Material not found")
-    return ai_service.verify_learning(material)
+    
+    context = await material_index.verification_context(material)
+    
+    async def events():
+        async for kind, payload in ai_service.stream_verification(material, context):
+            yield sse_event(kind, payload)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
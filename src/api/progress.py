@@ -1,20 +1,56 @@
 """
 Progress tracking API routes
 """
-from fastapi import APIRouter, Depends
-from src.core.models import ProgressUpdate, User
+from fastapi import APIRouter, Depends, Query
+from typing import Optional
+from src.core.config import settings
+from src.core.models import ProgressBatch, ProgressUpdate, User
 from src.services.auth_service import auth_service
+from src.services.progress_buffer import progress_buffer
 from src.services.progress_service import progress_service
 
 router = APIRouter(tags=["Progress"])
 
+@router.get("")
+async def list_progress(
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    include_pages: bool = False,
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """All of the user's progress records with material metadata (one query).
+    Page marks still in the write buffer are reflected in the counts and percentages."""
+    buffered = progress_buffer.buffered_material_ids(current_user.id)
+    overview = await progress_service.list_progress(current_user, skip, limit, include_pages, pages_for=buffered)
+    items = []
+    for item in overview["items"]:
+        if item["material_id"] in buffered:
+            item = progress_buffer.overlay(current_user.id, item["material_id"], item)
+            if not include_pages:
+                item = {k: v for k, v in item.items() if k != "completed_pages"}
+        items.append(item)
+    overview["items"] = items
+    return overview
+
+@router.post("/batch", status_code=202)
+async def record_progress_batch(
+    batch: ProgressBatch,
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """Buffer page completions and reading-time heartbeats for several materials.
+    Written to MongoDB within flush_interval_seconds (see ProgressWriteBuffer)."""
+    for item in batch.items:
+        progress_buffer.add(current_user.id, item)
+    return {"accepted": len(batch.items), "flush_interval_seconds": settings.PROGRESS_FLUSH_INTERVAL_SECONDS}
+
 @router.get("/{material_id}")
 async def get_progress(
     material_id: str,
     current_user: User = Depends(auth_service.get_current_user)
 ):
     """Get progress for a material"""
-    return progress_service.get_progress(material_id, current_user)
+    progress = await progress_service.get_progress(material_id, current_user)
+    return progress_buffer.overlay(current_user.id, material_id, progress)
 
 @router.put("/{material_id}")
 async def update_progress(
@@ -23,7 +59,7 @@ async def update_progress(
     current_user: User = Depends(auth_service.get_current_user)
 ):
     """Update progress for a material"""
-    return progress_service.update_progress(material_id, progress_update, current_user)
+    return await progress_service.update_progress(material_id, progress_update, current_user)
 
 @router.put("/{material_id}/page/{page_number}")
 async def mark_page_complete(
@@ -32,7 +68,7 @@ async def mark_page_complete(
     current_user: User = Depends(auth_service.get_current_user)
 ):
     """Mark a single page as completed for the current user"""
-    return progress_service.mark_page_complete(material_id, page_number, current_user)
+    return await progress_service.mark_page_complete(material_id, page_number, current_user)
 
 @router.put("/{material_id}/complete")
 async def complete_material(
@@ -40,4 +76,4 @@ async def complete_material(
     current_user: User = Depends(auth_service.get_current_user)
 ):
     """Mark entire material as completed"""
-    return progress_service.complete_material(material_id, current_user)
+    return await progress_service.complete_material(material_id, current_user)
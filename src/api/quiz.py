@@ -1,22 +1,84 @@
 """
 Quiz API routes
 """
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from src.core.models import QuestionResponse, AnswerRequest, User
+from src.core.config import settings
 from src.services.auth_service import auth_service
 from src.services.quiz_service import quiz_service
+from src.services.explanation_tickets import explanation_ticket_service
+from src.services.ai_service import ai_service
+from src.services.explanation_pregenerator import stored_option_explanation
+from src.utils.sse import sse_event, SSE_HEADERS
 
 router = APIRouter(tags=["Quiz"])
 
 @router.get("/daily", response_model=QuestionResponse)
 async def get_daily_question(current_user: User = Depends(auth_service.get_current_user)):
     """Get a daily question for the user"""
-    return quiz_service.get_daily_question(current_user)
+    return await quiz_service.get_daily_question(current_user)
 
 @router.post("/answer")
 async def check_answer(
     answer_request: AnswerRequest,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(auth_service.get_current_user)
 ):
-    """Submit an answer and get feedback"""
-    return quiz_service.check_answer(answer_request, current_user)
+    """Submit an answer and get feedback.
+    With explanation_mode="deferred" the explanation is delivered via a ticket."""
+    return await quiz_service.check_answer(answer_request, current_user, background_tasks)
+
+@router.post("/answer/stream")
+async def check_answer_stream(
+    answer_request: AnswerRequest,
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """Server-Sent Events: 'grade' at once, 'token' events while the explanation
+    is generated, then 'result' with the parsed {correct, explanation}."""
+    q, correct = await quiz_service.grade_answer(answer_request, current_user)
+    
+    async def events():
+        yield sse_event("grade", {"correct": correct, "correct_answer": q["answer"]})
+        stored = stored_option_explanation(q, answer_request.user_answer)
+        if stored is not None:
+            yield sse_event("result", {"correct": correct, "explanation": stored})
+            return
+        async for kind, payload in ai_service.stream_explanation(
+            q["public_text"], answer_request.user_answer, q["answer"],
+            question_id=q["question_id"], options=q.get("options")
+        ):
+            yield sse_event(kind, payload)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.get("/explanations/{ticket_id}")
+async def get_explanation(
+    ticket_id: str,
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """Poll a deferred explanation (status: pending, ready or failed)"""
+    return await explanation_ticket_service.get(ticket_id, current_user.id)
+
+@router.get("/explanations/{ticket_id}/stream")
+async def stream_explanation(
+    ticket_id: str,
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """Server-Sent Events: a single 'explanation' event once ready, 'expired' if the
+    ticket is gone, or 'timeout'"""
+    # Validate ownership before opening the stream so a bad ticket is a plain 404
+    await explanation_ticket_service.get(ticket_id, current_user.id)
+    
+    async def events():
+        ticket = await explanation_ticket_service.wait(
+            ticket_id, current_user.id, settings.EXPLANATION_STREAM_TIMEOUT_SECONDS
+        )
+        if ticket is None:
+            yield sse_event("timeout", {"ticket_id": ticket_id, "status": "pending"})
+        elif ticket["status"] == "expired":
+            yield sse_event("expired", ticket)
+        else:
+            yield sse_event("explanation", ticket)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
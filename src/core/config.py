@@ -1,6 +1,7 @@
 """
 Core configuration settings for the LMS application
 """
+import json
 import os
 from dotenv import load_dotenv
 
@@ -24,6 +25,15 @@ class Settings:
     ALGORITHM = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
     
+    # Password hashing (bcrypt runs on a bounded worker pool)
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+    PASSWORD_HASH_RETRY_AFTER_SECONDS = int(os.getenv("PASSWORD_HASH_RETRY_AFTER_SECONDS", "2"))
+    
+    # Authenticated user lookup cache
+    USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+    USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+    
     # Database
     MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017/")
     DATABASE_NAME = "learners_db"
@@ -31,12 +41,66 @@ class Settings:
     # AI/LLM
     OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:latest")
+    OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+    OLLAMA_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_TIMEOUT_SECONDS", "30"))
+    OLLAMA_SLOW_CALL_SECONDS = float(os.getenv("OLLAMA_SLOW_CALL_SECONDS", "20"))
+    OLLAMA_BREAKER_FAILURE_THRESHOLD = int(os.getenv("OLLAMA_BREAKER_FAILURE_THRESHOLD", "5"))
+    OLLAMA_BREAKER_RESET_SECONDS = float(os.getenv("OLLAMA_BREAKER_RESET_SECONDS", "30"))
     SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.8"))
+    EXPLANATION_CACHE_SIZE = int(os.getenv("EXPLANATION_CACHE_SIZE", "5000"))
+    EXPLANATION_CACHE_MEMORY_TTL_SECONDS = float(os.getenv("EXPLANATION_CACHE_MEMORY_TTL_SECONDS", "3600"))
+    EXPLANATION_CACHE_TTL_DAYS = int(os.getenv("EXPLANATION_CACHE_TTL_DAYS", "30"))
+    PREGEN_ENABLED = os.getenv("PREGEN_ENABLED", "False").lower() == "true"
+    PREGEN_INTERVAL_MINUTES = int(os.getenv("PREGEN_INTERVAL_MINUTES", "60"))
+    PREGEN_CONCURRENCY = int(os.getenv("PREGEN_CONCURRENCY", "1"))
+    EXPLANATION_TICKET_TTL_MINUTES = int(os.getenv("EXPLANATION_TICKET_TTL_MINUTES", "60"))
+    EXPLANATION_STREAM_TIMEOUT_SECONDS = float(os.getenv("EXPLANATION_STREAM_TIMEOUT_SECONDS", "120"))
+    
+    # Quiz
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-mpnet-base-v2")
+    LEXICAL_MAX_EDIT_DISTANCE = int(os.getenv("LEXICAL_MAX_EDIT_DISTANCE", "1"))
+    LEXICAL_MIN_LENGTH_FOR_EDITS = int(os.getenv("LEXICAL_MIN_LENGTH_FOR_EDITS", "6"))
+    EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+    EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "10"))
+    ANSWER_MATRIX_CACHE_SIZE = int(os.getenv("ANSWER_MATRIX_CACHE_SIZE", "4096"))
+    ANSWER_MATRIX_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_MATRIX_CACHE_TTL_SECONDS", "3600"))
+    QUESTION_INDEX_REFRESH_SECONDS = int(os.getenv("QUESTION_INDEX_REFRESH_SECONDS", "30"))
+    
+    # Learning verification (retrieval over per-material chunk embeddings)
+    VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "data/vector_index")
+    VERIFY_CHUNK_WORDS = int(os.getenv("VERIFY_CHUNK_WORDS", "200"))
+    VERIFY_CHUNK_OVERLAP_WORDS = int(os.getenv("VERIFY_CHUNK_OVERLAP_WORDS", "40"))
+    VERIFY_TOP_K = int(os.getenv("VERIFY_TOP_K", "4"))
+    VERIFY_MAX_CONTEXT_CHARS = int(os.getenv("VERIFY_MAX_CONTEXT_CHARS", "6000"))
     
     # File Upload
     MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "10485760"))  # 10MB
     UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads/materials")
     ALLOWED_EXTENSIONS = ["pdf", "txt", "mp4", "mov", "avi"]
+    VIDEO_EXTENSIONS = ["mp4", "mov", "avi"]
+    MAX_VIDEO_FILE_SIZE = int(os.getenv("MAX_VIDEO_FILE_SIZE", "2147483648"))  # 2GB
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", "1048576"))  # 1MB
+    UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR", "data/upload_tmp")
+    UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+    MATERIAL_PROCESSING_WORKERS = int(os.getenv("MATERIAL_PROCESSING_WORKERS", "2"))
+    FILE_RECONCILE_INTERVAL_MINUTES = int(os.getenv("FILE_RECONCILE_INTERVAL_MINUTES", "10"))
+    # Cache-Control for served material files, by exact media type, major type ("video/") or "default".
+    # Override/extend with a JSON object in FILE_CACHE_CONTROL. Files require auth, hence "private".
+    FILE_CACHE_CONTROL = {
+        "application/pdf": "private, max-age=3600",
+        "video/": "private, max-age=86400",
+        "default": "private, no-cache",
+        **json.loads(os.getenv("FILE_CACHE_CONTROL", "{}"))
+    }
+    
+    # Progress write buffer (batched page marks / reading heartbeats)
+    PROGRESS_FLUSH_INTERVAL_SECONDS = float(os.getenv("PROGRESS_FLUSH_INTERVAL_SECONDS", "2"))
+    PROGRESS_BUFFER_MAX_KEYS = int(os.getenv("PROGRESS_BUFFER_MAX_KEYS", "500"))
+
+    # Background jobs (chunked bulk changes, e.g. material delete cascades)
+    JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "1000"))
+    # Deletes cascading to more enrolled users than this run as a background job
+    CASCADE_INLINE_LIMIT = int(os.getenv("CASCADE_INLINE_LIMIT", "500"))
     
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
@@ -1,32 +1,170 @@
 """
 Database connection and setup
 """
-from pymongo import MongoClient
+import logging
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
 from src.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Declarative index registry: collection name -> indexes applied at startup.
+# Keep this in sync with QUERY_SHAPES below so the plan audit covers every index.
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        # Multikey: lets material delete cascades touch only the enrolled users
+        IndexModel([("enrolled_materials", ASCENDING)], name="enrolled_materials"),
+        # Department cohorts walked in _id order by bulk enrollment
+        IndexModel([("department", ASCENDING), ("_id", ASCENDING)], name="department_id"),
+    ],
+    "progress": [
+        IndexModel([("user_id", ASCENDING), ("material_id", ASCENDING)], name="user_material_unique", unique=True),
+        IndexModel([("material_id", ASCENDING)], name="material_id"),
+    ],
+    "questions": [
+        IndexModel([("question_id", ASCENDING)], name="question_id_unique", unique=True),
+        IndexModel([("department", ASCENDING), ("material_id", ASCENDING)], name="department_material"),
+    ],
+    "materials": [
+        IndexModel([("department", ASCENDING)], name="department"),
+    ],
+    "explanations": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "explanation_tickets": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    # Not a TTL index: expired sessions are purged by UploadService so their temp files go too
+    "upload_sessions": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at"),
+    ],
+    "blobs": [
+        IndexModel([("refcount", ASCENDING)], name="refcount"),
+    ],
+    "jobs": [
+        IndexModel([("status", ASCENDING)], name="status"),
+    ],
+}
+
+# Representative filters for every hot service query, used by audit_query_plans().
+# (name, collection, filter)
+QUERY_SHAPES = [
+    ("users by email (login/register)", "users", {"email": "audit@example.com"}),
+    ("users by id (current user)", "users", {"_id": "audit"}),
+    ("users by enrolled material (delete cascade)", "users", {"enrolled_materials": "audit"}),
+    ("users by department after cursor (bulk enroll)", "users", {"department": "audit", "_id": {"$gt": "audit"}}),
+    ("progress by user and material", "progress", {"user_id": "audit", "material_id": "audit"}),
+    ("progress overview by user", "progress", {"user_id": "audit"}),
+    ("progress by material (delete cascade)", "progress", {"material_id": "audit"}),
+    ("questions by question_id", "questions", {"question_id": "audit"}),
+    ("questions by department and material", "questions", {
+        "department": "audit",
+        "$or": [{"material_id": {"$in": ["audit"]}}, {"material_id": {"$exists": False}}]
+    }),
+    ("materials by department", "materials", {"department": "audit"}),
+    ("expired upload sessions", "upload_sessions", {"expires_at": {"$lt": 0}}),
+    ("unreferenced blobs (collection)", "blobs", {"refcount": {"$lte": 0}}),
+    ("unfinished jobs (resume)", "jobs", {"status": {"$in": ["queued", "running"]}}),
+]
+
+def _plan_stages(plan) -> list:
+    """Collect every 'stage' name from a (nested) explain winningPlan"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
 class Database:
-    """MongoDB database connection"""
+    """MongoDB database connection (async, Motor-backed)"""
     
     def __init__(self):
         self.client = None
         self.db = None
+        self._transactions: Optional[bool] = None
     
     def connect(self):
-        """Connect to MongoDB"""
-        self.client = MongoClient(settings.MONGO_URL)
-        self.db = self.client[settings.DATABASE_NAME]
+        """Connect to MongoDB (idempotent; services bind collections at import time)"""
+        if self.client is None:
+            self.client = AsyncIOMotorClient(settings.MONGO_URL)
+            self.db = self.client[settings.DATABASE_NAME]
         return self.db
     
     def disconnect(self):
         """Disconnect from MongoDB"""
         if self.client:
             self.client.close()
+            self.client = None
+            self.db = None
+            self._transactions = None
     
     def get_collection(self, name: str):
         """Get a collection from the database"""
         if self.db is None:
             self.connect()
         return self.db[name]
+    
+    async def supports_transactions(self) -> bool:
+        """Multi-document transactions need a replica set or sharded cluster"""
+        if self._transactions is None:
+            if self.client is None:
+                self.connect()
+            hello = await self.client.admin.command("isMaster")
+            self._transactions = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+        return self._transactions
+    
+    async def run_in_transaction(self, callback: Callable[[Any], Awaitable[T]]) -> T:
+        """Run ``callback(session)`` in a transaction and return its result.
+        
+        Uses ``with_transaction``, which retries the whole callback on
+        TransientTransactionError and the commit on UnknownTransactionCommitResult,
+        so callbacks must be safe to run more than once. On a standalone server the
+        callback runs once with session None (operations then run in order).
+        """
+        if not await self.supports_transactions():
+            return await callback(None)
+        async with await self.client.start_session() as session:
+            return await session.with_transaction(callback)
+    
+    async def ensure_indexes(self) -> dict:
+        """Create every index in INDEXES. Failures (e.g. duplicates blocking a
+        unique index) are logged and reported instead of aborting startup."""
+        report = {}
+        for collection_name, indexes in INDEXES.items():
+            collection = self.get_collection(collection_name)
+            for index in indexes:
+                name = index.document["name"]
+                try:
+                    await collection.create_indexes([index])
+                    report[f"{collection_name}.{name}"] = "ok"
+                except OperationFailure as e:
+                    logger.warning("Could not create index %s.%s: %s", collection_name, name, e)
+                    report[f"{collection_name}.{name}"] = f"failed: {e}"
+        return report
+    
+    async def audit_query_plans(self) -> list:
+        """Run explain() on every QUERY_SHAPES entry and flag collection scans"""
+        results = []
+        for name, collection_name, query in QUERY_SHAPES:
+            explain = await self.get_collection(collection_name).find(query).explain()
+            stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+            results.append({
+                "query": name,
+                "collection": collection_name,
+                "stages": stages,
+                "collscan": "COLLSCAN" in stages
+            })
+        return results
 
 # Singleton instance
 db = Database()
@@ -46,3 +184,21 @@ def get_progress_collection():
 
 def get_schedules_collection():
     return db.get_collection("schedules")
+
+def get_counters_collection():
+    return db.get_collection("counters")
+
+def get_explanations_collection():
+    return db.get_collection("explanations")
+
+def get_explanation_tickets_collection():
+    return db.get_collection("explanation_tickets")
+
+def get_upload_sessions_collection():
+    return db.get_collection("upload_sessions")
+
+def get_blobs_collection():
+    return db.get_collection("blobs")
+
+def get_jobs_collection():
+    return db.get_collection("jobs")
@@ -1,8 +1,8 @@
 """
 Pydantic models for request/response validation
 """
-from pydantic import BaseModel, EmailStr, validator
-from typing import List, Optional
+from pydantic import BaseModel, EmailStr, Field, validator
+from typing import List, Literal, Optional
 from datetime import datetime
 
 class UserCreate(BaseModel):
@@ -30,6 +30,7 @@ class User(BaseModel):
     email: str
     full_name: str
     department: str
+    role: str = "user"
     enrolled_materials: List[str] = []
     created_at: datetime
 
@@ -45,9 +46,21 @@ class QuestionResponse(BaseModel):
     question_type: str
     material_id: Optional[str] = None
 
+class QuestionCreate(BaseModel):
+    question_id: Optional[str] = None
+    question_text: str
+    public_text: Optional[str] = None
+    options: List[str] = []
+    answer: str
+    department: str
+    question_type: str
+    material_id: Optional[str] = None
+
 class AnswerRequest(BaseModel):
     question_id: str
     user_answer: str
+    # "deferred" returns the verdict at once plus an explanation ticket
+    explanation_mode: Literal["inline", "deferred"] = "inline"
 
 class MaterialCreate(BaseModel):
     title: str
@@ -68,6 +81,20 @@ class Material(BaseModel):
     file_exists: Optional[bool] = None
     pdf_header_valid: Optional[bool] = None
     total_pages: Optional[int] = None
+    processing_status: Optional[str] = None
+    thumbnail_path: Optional[str] = None
+    file_name: Optional[str] = None
+    file_size: Optional[int] = None
+    sha256: Optional[str] = None
+
+class BulkEnrollment(BaseModel):
+    """Cohort to enroll: a whole department or explicit user ids (exactly one)"""
+    department: Optional[str] = None
+    user_ids: Optional[List[str]] = Field(default=None, max_length=50000)
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    total_size: int
 
 class ProgressUpdate(BaseModel):
     material_id: str
@@ -75,6 +102,15 @@ class ProgressUpdate(BaseModel):
     completed_sections: List[str] = []
     completed_pages: Optional[List[int]] = None
 
+class ProgressBatchItem(BaseModel):
+    material_id: str
+    completed_pages: List[int] = Field(default_factory=list, max_length=500)
+    reading_seconds: float = Field(default=0.0, ge=0, le=3600)
+    current_page: Optional[int] = Field(default=None, ge=1)
+
+class ProgressBatch(BaseModel):
+    items: List[ProgressBatchItem] = Field(max_length=100)
+
 class ScheduleCreate(BaseModel):
     user_id: str
     question_time: str
@@ -4,21 +4,12 @@ AI/LLM service for quiz explanations and learning verification
 from langchain_ollama import ChatOllama
 from langchain_core.prompts import ChatPromptTemplate
 import json
+from typing import AsyncIterator, List, Optional, Tuple
 from src.core.config import settings
+from src.services.explanation_cache import explanation_cache
+from src.services.llm_gateway import llm_gateway
 
-class AIService:
-    """AI service for LLM interactions"""
-    
-    def __init__(self):
-        self.llm = ChatOllama(
-            model=settings.OLLAMA_MODEL,
-            base_url=settings.OLLAMA_BASE_URL,
-            format="json"
-        )
-    
-    def explain_answer(self, question: str, user_answer: str, correct_answer: str) -> dict:
-        """Generate explanation for a quiz answer"""
-        system_prompt = """
+EXPLANATION_SYSTEM_PROMPT = """
 You are a quiz answer explainer. Given a question, user's answer, and correct answer,
 do the following:
 1. State if the user's answer is correct or incorrect.
@@ -31,39 +22,8 @@ do the following:
 Respond ONLY in JSON format with two keys: 'correct' (a boolean true/false) and 'explanation' (a string).
 Do not include any text or formatting outside of the JSON object.
 """
-        
-        user_prompt = f"""
-Question: {question}
-User's Answer: {user_answer}
-Correct Answer: {correct_answer}
-"""
-        
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("human", user_prompt)
-        ])
-        
-        chain = prompt | self.llm
-        
-        try:
-            response = chain.invoke({})
-            json_str = response.content.strip()
-            result = json.loads(json_str)
-            return result
-        except json.JSONDecodeError:
-            return {
-                "correct": user_answer.lower().strip() == correct_answer.lower().strip(),
-                "explanation": "Could not parse model response. Please check the answers manually."
-            }
-        except Exception as e:
-            return {
-                "correct": False,
-                "explanation": f"Error generating explanation: {str(e)}"
-            }
-    
-    def verify_learning(self, material: dict) -> dict:
-        """Verify user's understanding of learning material"""
-        verification_prompt = """
+
+VERIFICATION_SYSTEM_PROMPT = """
 You are an educational assessment AI. Your task is to verify if a student has understood learning material.
 
 Given the material content, assess their understanding based on their progress.
@@ -76,35 +36,181 @@ Respond ONLY in JSON format with the following keys:
 
 Do not include any text outside of the JSON object.
 """
+
+class AIService:
+    """AI service for LLM interactions"""
+    
+    # Bump when the explanation prompt changes so cached explanations are not reused
+    EXPLAIN_PROMPT_VERSION = "1"
+    
+    def __init__(self):
+        self.llm = ChatOllama(
+            model=settings.OLLAMA_MODEL,
+            base_url=settings.OLLAMA_BASE_URL,
+            format="json"
+        )
+    
+    async def explain_answer(
+        self,
+        question: str,
+        user_answer: str,
+        correct_answer: str,
+        question_id: Optional[str] = None,
+        options: Optional[List[str]] = None
+    ) -> dict:
+        """Explain a quiz answer, serving repeated (question, answer) pairs from cache"""
+        try:
+            return await self.generate_explanation(question, user_answer, correct_answer, question_id, options)
+        except Exception as e:
+            return self._explanation_fallback(user_answer, correct_answer, e)
+    
+    async def generate_explanation(
+        self,
+        question: str,
+        user_answer: str,
+        correct_answer: str,
+        question_id: Optional[str] = None,
+        options: Optional[List[str]] = None,
+        background: bool = False
+    ) -> dict:
+        """Cached explanation or a fresh model one; raises instead of falling back"""
+        cache_key, question_key = self._explanation_cache_key(question, user_answer, correct_answer, question_id, options)
+        cached = await explanation_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        response = await llm_gateway.ainvoke(
+            self._explanation_chain(question, user_answer, correct_answer), background=background
+        )
+        result = json.loads(response.content.strip())
+        await self._cache_explanation(cache_key, question_key, result)
+        return result
+    
+    async def stream_explanation(
+        self,
+        question: str,
+        user_answer: str,
+        correct_answer: str,
+        question_id: Optional[str] = None,
+        options: Optional[List[str]] = None
+    ) -> AsyncIterator[Tuple[str, object]]:
+        """Yield ("token", text) chunks as generated, then one ("result", dict)"""
+        cache_key, question_key = self._explanation_cache_key(question, user_answer, correct_answer, question_id, options)
+        cached = await explanation_cache.get(cache_key)
+        if cached is not None:
+            yield ("result", cached)
+            return
+        
+        parts = []
+        try:
+            async for chunk in llm_gateway.astream(self._explanation_chain(question, user_answer, correct_answer)):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield ("token", chunk.content)
+            result = json.loads("".join(parts).strip())
+        except Exception as e:
+            yield ("result", self._explanation_fallback(user_answer, correct_answer, e))
+            return
         
+        await self._cache_explanation(cache_key, question_key, result)
+        yield ("result", result)
+    
+    async def verify_learning(self, material: dict, context: Optional[str] = None) -> dict:
+        """Verify user's understanding of learning material (context: retrieved excerpt)"""
+        try:
+            response = await llm_gateway.ainvoke(self._verification_chain(material, context))
+            json_str = response.content.strip()
+            result = json.loads(json_str)
+            return result
+        except Exception as e:
+            return self._verification_fallback(e)
+    
+    async def stream_verification(self, material: dict, context: Optional[str] = None) -> AsyncIterator[Tuple[str, object]]:
+        """Yield ("token", text) chunks as generated, then one ("result", dict)"""
+        parts = []
+        try:
+            async for chunk in llm_gateway.astream(self._verification_chain(material, context)):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield ("token", chunk.content)
+            result = json.loads("".join(parts).strip())
+        except Exception as e:
+            result = self._verification_fallback(e)
+        yield ("result", result)
+    
+    # Internal helpers
+    def _explanation_chain(self, question: str, user_answer: str, correct_answer: str):
+        user_prompt = f"""
+Question: {question}
+User's Answer: {user_answer}
+Correct Answer: {correct_answer}
+"""
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", EXPLANATION_SYSTEM_PROMPT),
+            ("human", user_prompt)
+        ])
+        return prompt | self.llm
+    
+    def _verification_chain(self, material: dict, context: Optional[str] = None):
+        if context is None:
+            context = (material.get('content') or 'Content not available')[:settings.VERIFY_MAX_CONTEXT_CHARS]
         user_prompt = f"""
 Material Title: {material.get('title', 'Unknown')}
-Material Content: {material.get('content', 'Content not available')}
+Material Content: {context}
 Department: {material.get('department', 'Unknown')}
 
 Based on this material, assess the student's understanding.
 """
-        
         prompt = ChatPromptTemplate.from_messages([
-            ("system", verification_prompt),
+            ("system", VERIFICATION_SYSTEM_PROMPT),
             ("human", user_prompt)
         ])
-        
-        chain = prompt | self.llm
-        
-        try:
-            response = chain.invoke({})
-            json_str = response.content.strip()
-            result = json.loads(json_str)
-            return result
-        except Exception as e:
+        return prompt | self.llm
+    
+    def _explanation_cache_key(
+        self,
+        question: str,
+        user_answer: str,
+        correct_answer: str,
+        question_id: Optional[str],
+        options: Optional[List[str]]
+    ):
+        question_key = explanation_cache.question_key(question, question_id, options)
+        cache_key = explanation_cache.make_key(
+            question_key, user_answer, correct_answer, settings.OLLAMA_MODEL, self.EXPLAIN_PROMPT_VERSION
+        )
+        return cache_key, question_key
+    
+    async def _cache_explanation(self, cache_key: str, question_key: str, result: dict) -> None:
+        await explanation_cache.set(
+            cache_key,
+            result,
+            question_key=question_key,
+            model=settings.OLLAMA_MODEL,
+            prompt_version=self.EXPLAIN_PROMPT_VERSION
+        )
+    
+    @staticmethod
+    def _explanation_fallback(user_answer: str, correct_answer: str, error: Exception) -> dict:
+        if isinstance(error, json.JSONDecodeError):
             return {
-                "understanding_level": 75,
-                "assessment": "Preliminary assessment completed. Full verification requires interactive Q&A.",
-                "recommendations": ["Complete interactive verification quiz", "Review challenging sections"],
-                "verified": True,
-                "error": str(e)
+                "correct": user_answer.lower().strip() == correct_answer.lower().strip(),
+                "explanation": "Could not parse model response. Please check the answers manually."
             }
+        return {
+            "correct": False,
+            "explanation": f"Error generating explanation: {str(error)}"
+        }
+    
+    @staticmethod
+    def _verification_fallback(error: Exception) -> dict:
+        return {
+            "understanding_level": 75,
+            "assessment": "Preliminary assessment completed. Full verification requires interactive Q&A.",
+            "recommendations": ["Complete interactive verification quiz", "Review challenging sections"],
+            "verified": True,
+            "error": str(error)
+        }
 
 # Singleton instance
 ai_service = AIService()
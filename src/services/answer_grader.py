@@ -0,0 +1,130 @@
+"""
+Lexical fast path for fill-in answer grading
+"""
+import re
+import unicodedata
+from typing import List, Optional
+
+_WHITESPACE = re.compile(r"\s+")
+# Punctuation that only decorates a token ("Paris.", "Washington,", "(CO2)"). Signs and
+# symbols that carry meaning ("-40", "C++", "3.14", ".5", "50%") are kept.
+_QUOTES_AND_BRACKETS = "\"'()[]{}"
+_TRAILING_PUNCTUATION = ".,;:!?"
+# Leading articles ignored by the token tier ('the Nile' == 'Nile'). "a" is never dropped:
+# it is as often a letter that distinguishes the answer ("Vitamin A", "A positive").
+_ARTICLES = {"the", "an"}
+
+def normalize_answer(text: str) -> str:
+    """Case-fold, strip decorative punctuation from token edges and collapse whitespace"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    tokens = (
+        token.strip(_QUOTES_AND_BRACKETS).rstrip(_TRAILING_PUNCTUATION).strip(_QUOTES_AND_BRACKETS)
+        for token in _WHITESPACE.split(text)
+    )
+    return " ".join(token for token in tokens if token)
+
+def answer_tokens(normalized: str) -> tuple:
+    """Sorted tokens without a leading article ('river nile' == 'the Nile River')"""
+    tokens = normalized.split(" ")
+    if len(tokens) > 1 and tokens[0] in _ARTICLES:
+        tokens = tokens[1:]
+    return tuple(sorted(t for t in tokens if t))
+
+def split_acceptable_answers(answer: str) -> List[str]:
+    """Split an answer key like 'A or B, C' into its acceptable answers"""
+    return [a.strip() for a in answer.replace(' or ', ',').split(',')]
+
+def bounded_edit_distance(a: str, b: str, max_distance: int) -> Optional[int]:
+    """Levenshtein distance, or None as soon as it must exceed max_distance"""
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            cost = previous[j - 1] + (ca != cb)
+            value = min(previous[j] + 1, current[j - 1] + 1, cost)
+            current.append(value)
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else None
+
+class AnswerGrader:
+    """Tiered lexical matcher tried before semantic (embedding) grading.
+    
+    Tiers only ever accept: exact normalized match, equal token multisets, then
+    a bounded edit distance for typos inside long alphabetic words. Anything
+    else is inconclusive and falls through to the embedding check, so the
+    expensive path decides every rejection exactly as before.
+    """
+    
+    TIERS = ("exact", "token_set", "edit_distance", "semantic")
+    
+    def __init__(self, max_edit_distance: int, min_length_for_edits: int):
+        self.max_edit_distance = max_edit_distance
+        self.min_length_for_edits = min_length_for_edits
+        self.counters = {tier: 0 for tier in self.TIERS}
+    
+    def match(self, user_answer: str, acceptable_answers: List[str]) -> Optional[str]:
+        """Return the name of the lexical tier that accepted the answer, or None"""
+        user_norm = normalize_answer(user_answer)
+        if not user_norm:
+            return None
+        candidates = [normalize_answer(a) for a in acceptable_answers]
+        candidates = [c for c in candidates if c]
+        
+        if user_norm in candidates:
+            return self._hit("exact")
+        
+        user_tokens = answer_tokens(user_norm)
+        if user_tokens and any(user_tokens == answer_tokens(c) for c in candidates):
+            return self._hit("token_set")
+        
+        if self.max_edit_distance > 0:
+            user_words = user_norm.split(" ")
+            for candidate in candidates:
+                if self._within_edits(user_words, candidate.split(" ")):
+                    return self._hit("edit_distance")
+        return None
+    
+    def record_semantic(self) -> None:
+        """Count a fall-through to embedding grading"""
+        self.counters["semantic"] += 1
+    
+    def _edits_allowed(self, token: str) -> bool:
+        # A one-character change in a number, symbol or short word ("B" for "A",
+        # "II" for "I", "-40" for "40") changes its meaning
+        return len(token) >= self.min_length_for_edits and token.isalpha()
+    
+    def _within_edits(self, user_words: List[str], candidate_words: List[str]) -> bool:
+        """Token by token, in order: short, numeric or symbolic tokens must match exactly
+        and typos are allowed only inside long words, max_edit_distance in total"""
+        if len(user_words) != len(candidate_words):
+            return False
+        budget = self.max_edit_distance
+        for user_word, candidate_word in zip(user_words, candidate_words):
+            if user_word == candidate_word:
+                continue
+            if not (self._edits_allowed(user_word) and self._edits_allowed(candidate_word)):
+                return False
+            distance = bounded_edit_distance(user_word, candidate_word, budget)
+            if distance is None:
+                return False
+            budget -= distance
+        return True
+    
+    def _hit(self, tier: str) -> str:
+        self.counters[tier] += 1
+        return tier
+    
+    def stats(self) -> dict:
+        total = sum(self.counters.values())
+        lexical = total - self.counters["semantic"]
+        return {
+            **self.counters,
+            "total": total,
+            "semantic_avoided_rate": round(lexical / total, 4) if total else 0.0
+        }
@@ -6,7 +6,8 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import timedelta
 import uuid
 from src.core.database import get_users_collection
-from src.core.security import verify_password, get_password_hash, create_access_token, decode_access_token
+from src.core.cache import TTLCache
+from src.core.security import password_hasher, create_access_token, decode_access_token
 from src.core.models import User, UserCreate, UserLogin, Token
 from src.core.config import settings
 
@@ -17,15 +18,21 @@ class AuthService:
     
     def __init__(self):
         self.users_collection = get_users_collection()
+        # Cached User objects keyed by user id; callers that change a user's
+        # document must invalidate it (see invalidate_user / invalidate_all_users)
+        self.user_cache = TTLCache(
+            max_size=settings.USER_CACHE_MAX_SIZE,
+            ttl_seconds=settings.USER_CACHE_TTL_SECONDS
+        )
     
-    def register_user(self, user_data: UserCreate) -> User:
+    async def register_user(self, user_data: UserCreate) -> User:
         """Register a new user"""
         # Check if user exists
-        if self.users_collection.find_one({"email": user_data.email}):
+        if await self.users_collection.find_one({"email": user_data.email}):
             raise HTTPException(status_code=400, detail="Email already registered")
         
         user_id = str(uuid.uuid4())
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await password_hasher.hash(user_data.password)
         
         from datetime import datetime
         user_doc = {
@@ -38,13 +45,13 @@ class AuthService:
             "created_at": datetime.utcnow()
         }
         
-        self.users_collection.insert_one(user_doc)
+        await self.users_collection.insert_one(user_doc)
         return User(**{**user_doc, "id": user_id})
     
-    def login_user(self, credentials: UserLogin) -> Token:
+    async def login_user(self, credentials: UserLogin) -> Token:
         """Login user and return access token"""
-        user = self.users_collection.find_one({"email": credentials.email})
-        if not user or not verify_password(credentials.password, user["password"]):
+        user = await self.users_collection.find_one({"email": credentials.email})
+        if not user or not await password_hasher.verify(credentials.password, user["password"]):
             raise HTTPException(status_code=401, detail="Incorrect email or password")
         
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -53,7 +60,7 @@ class AuthService:
         )
         return Token(access_token=access_token, token_type="bearer")
     
-    def get_current_user(self, credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+    async def get_current_user(self, credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
         """Get current authenticated user"""
         payload = decode_access_token(credentials.credentials)
         if not payload:
@@ -63,11 +70,32 @@ class AuthService:
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
         
-        user = self.users_collection.find_one({"_id": user_id})
+        cached = self.user_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
+        user = await self.users_collection.find_one({"_id": user_id})
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
         
-        return User(**{**user, "id": user["_id"]})
+        current_user = User(**{**user, "id": user["_id"]})
+        self.user_cache.set(user_id, current_user)
+        return current_user
+    
+    async def get_current_admin(self, credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+        """Get current authenticated user and require the admin role"""
+        current_user = await self.get_current_user(credentials)
+        if current_user.role != "admin":
+            raise HTTPException(status_code=403, detail="Admin privileges required")
+        return current_user
+    
+    def invalidate_user(self, user_id: str) -> None:
+        """Drop a cached user after their document changed"""
+        self.user_cache.invalidate(user_id)
+    
+    def invalidate_all_users(self) -> None:
+        """Drop every cached user (bulk updates across many users)"""
+        self.user_cache.clear()
 
 # Singleton instance
 auth_service = AuthService()
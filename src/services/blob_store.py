@@ -0,0 +1,162 @@
+"""
+Content-addressed storage for uploaded material files
+"""
+import asyncio
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from src.core.config import settings
+from src.core.database import get_blobs_collection
+
+logger = logging.getLogger(__name__)
+
+class BlobStore:
+    """Stores each distinct file once, keyed by SHA-256, with reference counts.
+
+    Blobs live at ``uploads/blobs/<sha[:2]>/<sha>.<ext>`` (the extension of the
+    first upload is kept so MIME detection and type checks keep working). The
+    ``blobs`` collection holds one document per blob with a ``refcount`` of the
+    materials pointing at it; the file is unlinked only when the last reference
+    is released. put/release for the same hash are serialized per process;
+    across processes the document is written before the file and deletes go
+    through a tombstone rename, so a concurrent put never loses its file.
+    """
+
+    def __init__(self):
+        self.blobs_collection = get_blobs_collection()
+        self.uploads_root = Path(settings.UPLOAD_DIR).parent
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    @staticmethod
+    def blob_rel_path(sha256: str, ext: str) -> str:
+        return f"blobs/{sha256[:2]}/{sha256}.{ext}"
+
+    def _lock(self, sha256: str) -> asyncio.Lock:
+        return self._locks.setdefault(sha256, asyncio.Lock())
+
+    async def put(self, src_path: Path, sha256: str, ext: str, size: int) -> str:
+        """Take ownership of ``src_path`` as the blob for ``sha256`` and add a reference.
+
+        If the blob already exists the source file is discarded instead of written.
+        Returns the blob path relative to the uploads root.
+        """
+        async with self._lock(sha256):
+            for _ in range(3):
+                blob = await self.blobs_collection.find_one_and_update(
+                    {"_id": sha256},
+                    {"$inc": {"refcount": 1}},
+                    return_document=ReturnDocument.AFTER
+                )
+                if blob is not None:
+                    blob_abs = self.uploads_root / blob["path"]
+                    if await asyncio.to_thread(blob_abs.exists):
+                        await asyncio.to_thread(src_path.unlink, True)
+                    else:
+                        # Blob file went missing (or is being tombstoned); this upload restores it
+                        logger.warning("Restoring missing blob %s", blob["path"])
+                        await self._move_or_release(src_path, blob)
+                    return blob["path"]
+
+                # The document goes in before the file: a worker deleting the previous blob
+                # re-checks for it after moving its file aside (see _delete_unreferenced)
+                blob = {
+                    "_id": sha256,
+                    "path": self.blob_rel_path(sha256, ext),
+                    "size": size,
+                    "refcount": 1,
+                    "created_at": datetime.utcnow()
+                }
+                try:
+                    await self.blobs_collection.insert_one(blob)
+                except DuplicateKeyError:
+                    # Another process stored the same content first; take a reference to it
+                    continue
+                await self._move_or_release(src_path, blob)
+                return blob["path"]
+            raise RuntimeError(f"Could not store blob {sha256}: concurrent updates")
+
+    async def _move_or_release(self, src_path: Path, blob: dict) -> None:
+        try:
+            await asyncio.to_thread(self._move, src_path, self.uploads_root / blob["path"])
+        except BaseException:
+            await self._drop_reference(blob["_id"])
+            raise
+
+    async def release(self, sha256: str) -> bool:
+        """Drop one reference; unlinks the file with the last one. Returns True if unlinked."""
+        async with self._lock(sha256):
+            return await self._drop_reference(sha256)
+
+    async def _drop_reference(self, sha256: str) -> bool:
+        blob = await self.blobs_collection.find_one_and_update(
+            {"_id": sha256, "refcount": {"$gt": 0}},
+            {"$inc": {"refcount": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if blob is None or blob["refcount"] > 0:
+            return False
+        return await self._delete_unreferenced(blob)
+
+    async def _delete_unreferenced(self, blob: dict) -> bool:
+        """Delete a blob's document and file if it still has no references (caller holds its lock).
+
+        The per-hash lock only covers this process. Another worker may store the
+        same content right after the document is deleted, moving its upload onto
+        the same path, so the file is first renamed to a tombstone and only
+        removed if no new document for the hash appeared; otherwise it is put back.
+        """
+        result = await self.blobs_collection.delete_one({"_id": blob["_id"], "refcount": {"$lte": 0}})
+        if not result.deleted_count:
+            return False
+        blob_abs = self.uploads_root / blob["path"]
+        tombstone = blob_abs.with_name(f"{blob_abs.name}.{uuid.uuid4().hex}.deleting")
+        try:
+            await asyncio.to_thread(os.replace, blob_abs, tombstone)
+        except FileNotFoundError:
+            return True
+        except OSError as e:
+            logger.warning("Could not remove blob %s: %s", blob["path"], e)
+            return True
+        current = await self.blobs_collection.find_one({"_id": blob["_id"]}, {"path": 1})
+        restore = current is not None and current["path"] == blob["path"]
+        await asyncio.to_thread(self._settle_tombstone, tombstone, blob_abs, restore)
+        return True
+
+    @staticmethod
+    def _settle_tombstone(tombstone: Path, blob_abs: Path, restore: bool) -> None:
+        # Same hash, same bytes: if the new owner already moved its copy in, keep that one
+        if restore and not blob_abs.exists():
+            os.replace(tombstone, blob_abs)
+        else:
+            tombstone.unlink(missing_ok=True)
+
+    async def collect_unreferenced(self) -> int:
+        """Remove blobs left at refcount 0 (e.g. by a recount or an interrupted release)"""
+        collected = 0
+        async for blob in self.blobs_collection.find({"refcount": {"$lte": 0}}, {"path": 1}):
+            async with self._lock(blob["_id"]):
+                collected += await self._delete_unreferenced(blob)
+        if collected:
+            logger.info("Collected %d unreferenced blob(s)", collected)
+        return collected
+
+    async def get(self, sha256: str) -> Optional[dict]:
+        return await self.blobs_collection.find_one({"_id": sha256})
+
+    @staticmethod
+    def _move(src: Path, dest: Path) -> None:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(src, dest)
+        except OSError:
+            # Different filesystem (e.g. UPLOAD_TMP_DIR on another volume)
+            shutil.move(str(src), str(dest))
+
+# Singleton instance
+blob_store = BlobStore()
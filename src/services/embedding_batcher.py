@@ -0,0 +1,109 @@
+"""
+Micro-batching front end for sentence embedding inference
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+import numpy as np
+
+class EmbeddingBatcher:
+    """Coalesces concurrent encode() calls into batched model invocations.
+    
+    Requests are collected for up to ``max_wait_ms`` or until ``max_batch_size``
+    texts are queued, encoded as one batch on a dedicated worker thread (off the
+    event loop), and each caller's future is resolved with its own vector.
+    """
+    
+    def __init__(self, encode_batch: Callable[[List[str]], np.ndarray], max_batch_size: int, max_wait_ms: float):
+        self.encode_batch = encode_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max_wait_ms
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.batches = 0
+        self.items = 0
+        self.full_batches = 0
+        self.errors = 0
+    
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedder")
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+    
+    async def encode(self, text: str) -> np.ndarray:
+        """Encode a single text; batched transparently with concurrent callers"""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+    
+    async def encode_many(self, texts: List[str]) -> List[np.ndarray]:
+        """Encode many texts (e.g. document chunks) through the same queue and model thread"""
+        return list(await asyncio.gather(*(self.encode(text) for text in texts)))
+    
+    async def _collect_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+    
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            pending = [(text, future) for text, future in batch if not future.done()]
+            if not pending:
+                continue
+            self.batches += 1
+            self.items += len(pending)
+            if len(pending) >= self.max_batch_size:
+                self.full_batches += 1
+            try:
+                vectors = await loop.run_in_executor(
+                    self._executor, self.encode_batch, [text for text, _ in pending]
+                )
+                for (_, future), vector in zip(pending, vectors):
+                    if not future.done():
+                        future.set_result(vector)
+            except Exception as e:
+                self.errors += 1
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+    
+    async def stop(self) -> None:
+        """Cancel the batching task and release the worker thread"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "full_batches": self.full_batches,
+            "errors": self.errors,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "fill_rate": round(self.items / (self.batches * self.max_batch_size), 4) if self.batches else 0.0
+        }
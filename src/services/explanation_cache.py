@@ -0,0 +1,99 @@
+"""
+Content-addressed cache for LLM answer explanations
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+from pymongo.errors import PyMongoError
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.core.database import get_explanations_collection
+from src.services.answer_grader import normalize_answer
+
+logger = logging.getLogger(__name__)
+
+class ExplanationCache:
+    """In-process LRU tier backed by the ``explanations`` collection (TTL-expired).
+    
+    Keys hash everything that determines the model output, so a changed question,
+    answer key, model or prompt version simply misses instead of serving stale text.
+    Mongo errors degrade to a cache miss; they never fail the request.
+    """
+    
+    def __init__(self):
+        self.collection = get_explanations_collection()
+        self.memory = TTLCache(
+            max_size=settings.EXPLANATION_CACHE_SIZE,
+            ttl_seconds=settings.EXPLANATION_CACHE_MEMORY_TTL_SECONDS
+        )
+        self.db_hits = 0
+        self.db_misses = 0
+        self.errors = 0
+    
+    @staticmethod
+    def make_key(question_key: str, user_answer: str, correct_answer: str, model: str, prompt_version: str) -> str:
+        payload = json.dumps([
+            question_key,
+            normalize_answer(user_answer),
+            correct_answer.strip(),
+            model,
+            prompt_version
+        ])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def question_key(question_text: str, question_id: Optional[str] = None, options: Optional[List[str]] = None) -> str:
+        """Hash of the question text and options, prefixed with the question id when known.
+        
+        The id groups a question's entries; the hash makes an edited question miss.
+        """
+        digest = hashlib.sha256(json.dumps([question_text, options or []]).encode("utf-8")).hexdigest()
+        return f"{question_id}:{digest}" if question_id else digest
+    
+    async def get(self, key: str) -> Optional[dict]:
+        result = self.memory.get(key)
+        if result is not None:
+            return result
+        try:
+            doc = await self.collection.find_one({"_id": key}, {"result": 1})
+        except PyMongoError as e:
+            self.errors += 1
+            logger.warning("Explanation cache lookup failed: %s", e)
+            return None
+        if doc is None:
+            self.db_misses += 1
+            return None
+        self.db_hits += 1
+        self.memory.set(key, doc["result"])
+        return doc["result"]
+    
+    async def set(self, key: str, result: dict, **metadata) -> None:
+        self.memory.set(key, result)
+        now = datetime.utcnow()
+        try:
+            await self.collection.update_one(
+                {"_id": key},
+                {"$set": {
+                    "result": result,
+                    **metadata,
+                    "created_at": now,
+                    "expires_at": now + timedelta(days=settings.EXPLANATION_CACHE_TTL_DAYS)
+                }},
+                upsert=True
+            )
+        except PyMongoError as e:
+            self.errors += 1
+            logger.warning("Explanation cache store failed: %s", e)
+    
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "db_hits": self.db_hits,
+            "db_misses": self.db_misses,
+            "errors": self.errors
+        }
+
+# Singleton instance
+explanation_cache = ExplanationCache()
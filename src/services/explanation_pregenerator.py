@@ -0,0 +1,133 @@
+"""
+Offline pre-generation of explanations for every multiple-choice option
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import Optional
+from src.core.config import settings
+from src.core.database import get_questions_collection
+from src.services.ai_service import ai_service
+from src.services.llm_gateway import LLMUnavailableError
+
+logger = logging.getLogger(__name__)
+
+def option_explanations_hash(q: dict) -> str:
+    """Fingerprint of everything the stored option explanations depend on"""
+    payload = json.dumps([
+        q.get("public_text"),
+        q.get("options", []),
+        q.get("answer"),
+        settings.OLLAMA_MODEL,
+        ai_service.EXPLAIN_PROMPT_VERSION
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def stored_option_explanation(q: dict, user_answer: str) -> Optional[str]:
+    """Pre-generated explanation for the chosen option, if present and current"""
+    if not q.get("option_explanations") or q.get("option_explanations_hash") != option_explanations_hash(q):
+        return None
+    chosen = user_answer.strip().lower()
+    for entry in q["option_explanations"]:
+        if entry["option"].strip().lower() == chosen:
+            return entry["explanation"]
+    return None
+
+PAGE_SIZE = 100
+
+class ExplanationPregenerator:
+    """Walks the question bank and stores an explanation per MCQ option on the question.
+    
+    Incremental: questions whose option_explanations_hash matches are skipped.
+    Resumable: each question is written as soon as all its options are done, and
+    options already explained are served from the explanation cache on a rerun.
+    A run stops early when the LLM is unavailable and picks up on the next run.
+    Questions are read in _id-ordered pages, so no cursor is held open across
+    the slow model calls, and model calls go through the gateway as background
+    work so interactive requests keep priority.
+    """
+    
+    def __init__(self):
+        self.questions_collection = get_questions_collection()
+        self._running = False
+    
+    async def run(self, limit: Optional[int] = None) -> dict:
+        if self._running:
+            return {"status": "already_running"}
+        self._running = True
+        try:
+            return await self._run(limit)
+        finally:
+            self._running = False
+    
+    async def _run(self, limit: Optional[int]) -> dict:
+        report = {"processed": 0, "skipped": 0, "failed": 0, "stopped_early": False}
+        semaphore = asyncio.Semaphore(max(1, settings.PREGEN_CONCURRENCY))
+        pending = set()
+        last_id = None
+        done = False
+        while not done:
+            query = {"options.0": {"$exists": True}}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            page = await self.questions_collection.find(
+                query,
+                {"question_id": 1, "public_text": 1, "options": 1, "answer": 1, "option_explanations_hash": 1}
+            ).sort("_id", 1).limit(PAGE_SIZE).to_list(length=PAGE_SIZE)
+            if not page:
+                break
+            last_id = page[-1]["_id"]
+            for q in page:
+                if q.get("option_explanations_hash") == option_explanations_hash(q):
+                    report["skipped"] += 1
+                    continue
+                attempted = report["processed"] + report["failed"] + len(pending)
+                if report["stopped_early"] or (limit is not None and attempted >= limit):
+                    done = True
+                    break
+                await semaphore.acquire()
+                task = asyncio.ensure_future(self._process_question(q, report))
+                task.add_done_callback(lambda _: semaphore.release())
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+        return report
+    
+    async def _process_question(self, q: dict, report: dict) -> None:
+        if report["stopped_early"]:
+            return
+        entries = []
+        try:
+            for option in q["options"]:
+                result = await ai_service.generate_explanation(
+                    q["public_text"], option, q["answer"],
+                    question_id=q["question_id"], options=q["options"], background=True
+                )
+                entries.append({
+                    "option": option,
+                    "explanation": result.get("explanation", "No explanation available.")
+                })
+        except LLMUnavailableError as e:
+            logger.warning("Stopping explanation pre-generation, LLM unavailable: %s", e)
+            report["stopped_early"] = True
+            return
+        except Exception as e:
+            logger.warning("Explanation pre-generation failed for %s: %s", q["question_id"], e)
+            report["failed"] += 1
+            return
+        
+        await self.questions_collection.update_one(
+            {"_id": q["_id"]},
+            {"$set": {
+                "option_explanations": entries,
+                "option_explanations_hash": option_explanations_hash(q),
+                "option_explanations_at": datetime.utcnow()
+            }}
+        )
+        report["processed"] += 1
+
+# Singleton instance
+explanation_pregenerator = ExplanationPregenerator()
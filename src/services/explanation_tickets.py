@@ -0,0 +1,100 @@
+"""
+Deferred explanation delivery: tickets resolved by background tasks
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException
+from src.core.config import settings
+from src.core.database import get_explanation_tickets_collection
+
+POLL_INTERVAL_SECONDS = 0.5
+
+class ExplanationTicketService:
+    """Tracks explanations produced after the grading response was sent.
+    
+    Ticket state lives in the ``explanation_tickets`` collection so any worker
+    can answer a poll; waiters in the worker that produced the explanation are
+    woken immediately through an in-process event. Events of tickets that are
+    never resolved (e.g. the background task did not run) are swept once the
+    ticket itself has expired.
+    """
+    
+    def __init__(self):
+        self.tickets_collection = get_explanation_tickets_collection()
+        # ticket id -> (event, loop time after which it is swept)
+        self._events: Dict[str, Tuple[asyncio.Event, float]] = {}
+    
+    async def create(self, user_id: str, question_id: str) -> str:
+        ticket_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        await self.tickets_collection.insert_one({
+            "_id": ticket_id,
+            "user_id": user_id,
+            "question_id": question_id,
+            "status": "pending",
+            "explanation": None,
+            "created_at": now,
+            "expires_at": now + timedelta(minutes=settings.EXPLANATION_TICKET_TTL_MINUTES)
+        })
+        loop = asyncio.get_running_loop()
+        self._sweep(loop.time())
+        self._events[ticket_id] = (asyncio.Event(), loop.time() + settings.EXPLANATION_TICKET_TTL_MINUTES * 60)
+        return ticket_id
+    
+    def _sweep(self, now: float) -> None:
+        for ticket_id in [t for t, (_, expires) in self._events.items() if expires <= now]:
+            del self._events[ticket_id]
+    
+    async def resolve(self, ticket_id: str, explanation: str, status: str = "ready") -> None:
+        await self.tickets_collection.update_one(
+            {"_id": ticket_id},
+            {"$set": {"status": status, "explanation": explanation, "completed_at": datetime.utcnow()}}
+        )
+        entry = self._events.pop(ticket_id, None)
+        if entry is not None:
+            entry[0].set()
+    
+    async def _find(self, ticket_id: str, user_id: str) -> Optional[dict]:
+        ticket = await self.tickets_collection.find_one({"_id": ticket_id, "user_id": user_id})
+        if not ticket:
+            return None
+        return {
+            "ticket_id": ticket_id,
+            "status": ticket["status"],
+            "explanation": ticket.get("explanation")
+        }
+    
+    async def get(self, ticket_id: str, user_id: str) -> dict:
+        ticket = await self._find(ticket_id, user_id)
+        if ticket is None:
+            raise HTTPException(status_code=404, detail="Explanation ticket not found")
+        return ticket
+    
+    async def wait(self, ticket_id: str, user_id: str, timeout: float) -> Optional[dict]:
+        """Wait until the ticket leaves 'pending'; None on timeout. Never raises for a
+        missing ticket (it may expire mid-stream): that returns status 'expired'."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            ticket = await self._find(ticket_id, user_id)
+            if ticket is None:
+                return {"ticket_id": ticket_id, "status": "expired", "explanation": None}
+            if ticket["status"] != "pending":
+                return ticket
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            entry = self._events.get(ticket_id)
+            event = entry[0] if entry is not None else None
+            try:
+                if event is not None:
+                    await asyncio.wait_for(event.wait(), remaining)
+                else:
+                    await asyncio.sleep(min(remaining, POLL_INTERVAL_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+
+# Singleton instance
+explanation_ticket_service = ExplanationTicketService()
@@ -0,0 +1,99 @@
+"""
+Background reconciliation of cached file flags on material documents
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List
+from pymongo import UpdateOne
+from src.core.config import settings
+from src.core.database import get_materials_collection
+from src.services.blob_store import blob_store
+from src.utils.file_processing import inspect_file
+
+logger = logging.getLogger(__name__)
+
+# Fields maintained on material documents (set at upload, refreshed here)
+FILE_FLAG_FIELDS = ("file_exists", "file_size", "file_mtime", "pdf_header_valid")
+
+class FileReconciler:
+    """Refreshes file_exists / pdf_header_valid / size / mtime for all materials.
+
+    Listing endpoints only read these cached fields, so they never touch the
+    filesystem. This job stats files in batches off the event loop, re-reads a
+    PDF header only when size or mtime changed, and writes back just the
+    documents whose flags differ with one bulk_write per batch. It also sweeps
+    blobs left at refcount 0.
+    """
+
+    BATCH_SIZE = 200
+
+    def __init__(self):
+        self.materials_collection = get_materials_collection()
+        self.uploads_root = Path(settings.UPLOAD_DIR).parent
+        self.runs = 0
+        self.last_run = None
+
+    def _inspect_batch(self, batch: List[dict]) -> List[dict]:
+        return [
+            inspect_file(
+                str(self.uploads_root / mat["file_path"]),
+                mat["file_path"].lower().endswith(".pdf"),
+                mat.get("file_size"),
+                mat.get("file_mtime"),
+                mat.get("pdf_header_valid")
+            )
+            for mat in batch
+        ]
+
+    async def _reconcile(self, batch: List[dict]) -> int:
+        results = await asyncio.to_thread(self._inspect_batch, batch)
+        ops = [
+            UpdateOne({"_id": mat["_id"]}, {"$set": flags})
+            for mat, flags in zip(batch, results)
+            if any(mat.get(field) != value for field, value in flags.items())
+        ]
+        if ops:
+            await self.materials_collection.bulk_write(ops, ordered=False)
+        return len(ops)
+
+    async def run(self) -> dict:
+        """Check every material with a stored file; returns a summary"""
+        started = time.perf_counter()
+        checked = updated = 0
+        batch: List[dict] = []
+        cursor = self.materials_collection.find(
+            {"file_path": {"$nin": [None, ""]}},
+            {"file_path": 1, **{field: 1 for field in FILE_FLAG_FIELDS}}
+        )
+        async for mat in cursor:
+            batch.append(mat)
+            if len(batch) >= self.BATCH_SIZE:
+                updated += await self._reconcile(batch)
+                checked += len(batch)
+                batch = []
+        if batch:
+            updated += await self._reconcile(batch)
+            checked += len(batch)
+        # Blobs whose last reference is gone but whose release did not delete them
+        blobs_collected = await blob_store.collect_unreferenced()
+
+        self.runs += 1
+        self.last_run = {
+            "finished_at": datetime.utcnow(),
+            "checked": checked,
+            "updated": updated,
+            "blobs_collected": blobs_collected,
+            "duration_seconds": round(time.perf_counter() - started, 3)
+        }
+        if updated:
+            logger.info("File reconciler updated %d of %d materials", updated, checked)
+        return self.last_run
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "last_run": self.last_run}
+
+# Singleton instance
+file_reconciler = FileReconciler()
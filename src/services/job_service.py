@@ -0,0 +1,150 @@
+"""
+Durable background jobs for chunked bulk changes
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+from src.core.database import get_jobs_collection
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+UNFINISHED = ["queued", "running"]
+
+class JobService:
+    """Runs registered job kinds as asyncio tasks and keeps their state in the
+    jobs collection.
+
+    Handlers work in chunks and call report() after each one, so clients can
+    poll progress and a job interrupted by a restart resumes from its stored
+    cursor (resume_pending() at startup). Handlers must therefore be idempotent
+    per chunk.
+    """
+
+    def __init__(self):
+        self.jobs_collection = get_jobs_collection()
+        self._handlers: Dict[str, Handler] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.completed = 0
+        self.failed = 0
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    async def create(self, kind: str, params: dict, created_by: Optional[str], total: Optional[int] = None) -> dict:
+        """Persist a queued job; call start() once the caller's own writes are done"""
+        now = datetime.utcnow()
+        job = {
+            "_id": str(uuid.uuid4()),
+            "kind": kind,
+            "params": params,
+            "status": "queued",
+            "created_by": created_by,
+            "created_at": now,
+            "updated_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "total": total,
+            "processed": 0,
+            "cursor": None,
+            "error": None
+        }
+        await self.jobs_collection.insert_one(job)
+        return job
+
+    def start(self, job: dict) -> None:
+        job_id = job["_id"]
+        if job_id in self._tasks:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def submit(self, kind: str, params: dict, created_by: Optional[str], total: Optional[int] = None) -> dict:
+        job = await self.create(kind, params, created_by, total)
+        self.start(job)
+        return job
+
+    async def _set(self, job_id: str, **fields: Any) -> None:
+        await self.jobs_collection.update_one(
+            {"_id": job_id},
+            {"$set": {**fields, "updated_at": datetime.utcnow()}}
+        )
+
+    async def _run(self, job: dict) -> None:
+        handler = self._handlers[job["kind"]]
+        started_at = job.get("started_at") or datetime.utcnow()
+        job["started_at"] = started_at
+        await self._set(job["_id"], status="running", started_at=started_at)
+        try:
+            await handler(job)
+        except asyncio.CancelledError:
+            # Shutdown: left "running" so resume_pending() picks it up
+            raise
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job["_id"], job["kind"])
+            self.failed += 1
+            await self._set(job["_id"], status="failed", error=str(e), finished_at=datetime.utcnow())
+            return
+        self.completed += 1
+        await self._set(job["_id"], status="completed", finished_at=datetime.utcnow())
+
+    async def cancel(self, job_id: str, reason: str) -> None:
+        """Mark a job that was never started as cancelled so it is not resumed"""
+        await self._set(job_id, status="cancelled", error=reason, finished_at=datetime.utcnow())
+
+    async def report(self, job_id: str, processed: int, cursor: Any = None, total: Optional[int] = None) -> None:
+        """Record a finished chunk: adds to processed and stores the resume cursor"""
+        fields = {"updated_at": datetime.utcnow()}
+        if cursor is not None:
+            fields["cursor"] = cursor
+        if total is not None:
+            fields["total"] = total
+        await self.jobs_collection.update_one({"_id": job_id}, {"$inc": {"processed": processed}, "$set": fields})
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = await self.jobs_collection.find_one({"_id": job_id})
+        return self._view(job) if job else None
+
+    @staticmethod
+    def _view(job: dict) -> dict:
+        view = {k: v for k, v in job.items() if k != "_id"}
+        view["id"] = job["_id"]
+        started, ended = job.get("started_at"), job.get("finished_at") or datetime.utcnow()
+        elapsed = (ended - started).total_seconds() if started else 0
+        view["items_per_second"] = round(job["processed"] / elapsed, 1) if elapsed > 0 else None
+        return view
+
+    async def resume_pending(self) -> int:
+        """Restart jobs interrupted by a shutdown or crash; returns how many"""
+        resumed = 0
+        async for job in self.jobs_collection.find({"status": {"$in": UNFINISHED}}):
+            if job["kind"] not in self._handlers:
+                logger.warning("No handler for job %s of kind %s", job["_id"], job["kind"])
+                continue
+            self.start(job)
+            resumed += 1
+        if resumed:
+            logger.info("Resumed %d background job(s)", resumed)
+        return resumed
+
+    async def shutdown(self) -> None:
+        """Cancel running jobs; they resume from their last reported chunk on next start"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._tasks),
+            "completed": self.completed,
+            "failed": self.failed,
+            "kinds": sorted(self._handlers)
+        }
+
+# Singleton instance
+job_service = JobService()
@@ -0,0 +1,230 @@
+"""
+Async gateway to the shared Ollama instance: concurrency limit, deadlines, circuit breaker
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Optional
+from src.core.config import settings
+
+class LLMUnavailableError(Exception):
+    """The model could not be used (circuit open, deadline exceeded or call failed)"""
+
+class CircuitBreaker:
+    """Opens after consecutive failures or slow calls; lets one probe through after a cooldown"""
+    
+    def __init__(self, failure_threshold: int, reset_timeout_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probe_in_flight = False
+    
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout_seconds:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+    
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+    
+    def release_probe(self) -> None:
+        """Call abandoned without an outcome (e.g. client disconnected)"""
+        self._probe_in_flight = False
+    
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+class LLMGateway:
+    """Single entry point for model calls.
+    
+    A global semaphore matches Ollama's parallelism, every call has a deadline
+    covering queueing and generation, and failures or slow calls feed a circuit
+    breaker. Callers catch LLMUnavailableError and use their fallback response.
+    
+    Background calls (offline pre-generation) are capped below the global limit
+    so at least one slot stays free for interactive requests, are refused unless
+    the breaker is fully closed, and do not feed the breaker themselves.
+    """
+    
+    def __init__(self, max_concurrency: int, timeout_seconds: float, slow_call_seconds: float, breaker: CircuitBreaker):
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.breaker = breaker
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._background_semaphore: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.background_calls = 0
+        self.latencies = deque(maxlen=500)
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+    
+    def _get_background_semaphore(self) -> asyncio.Semaphore:
+        if self._background_semaphore is None:
+            self._background_semaphore = asyncio.Semaphore(max(1, self.max_concurrency - 1))
+        return self._background_semaphore
+    
+    def _admit(self, background: bool = False) -> None:
+        if background:
+            if self.breaker.state != "closed":
+                self.rejected += 1
+                raise LLMUnavailableError("LLM circuit breaker is not closed")
+            return
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise LLMUnavailableError("LLM circuit breaker is open")
+    
+    def _record(self, started: float, error: Optional[BaseException], background: bool = False) -> None:
+        duration = time.monotonic() - started
+        self.latencies.append(duration)
+        if background:
+            return
+        if error is None and duration < self.slow_call_seconds:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+    
+    async def ainvoke(self, runnable, inputs: Optional[dict] = None, background: bool = False) -> Any:
+        """Run ``runnable.ainvoke`` under the concurrency limit and deadline"""
+        self._admit(background)
+        self.calls += 1
+        if background:
+            self.background_calls += 1
+        started = time.monotonic()
+        try:
+            if background:
+                async with self._get_background_semaphore():
+                    result = await asyncio.wait_for(self._call(runnable, inputs or {}), self.timeout_seconds)
+            else:
+                result = await asyncio.wait_for(self._call(runnable, inputs or {}), self.timeout_seconds)
+        except asyncio.CancelledError:
+            if not background:
+                self.breaker.release_probe()
+            raise
+        except asyncio.TimeoutError as e:
+            self.timeouts += 1
+            self._record(started, e, background)
+            raise LLMUnavailableError(f"LLM call exceeded {self.timeout_seconds}s deadline") from e
+        except Exception as e:
+            self.failures += 1
+            self._record(started, e, background)
+            raise LLMUnavailableError(f"LLM call failed: {e}") from e
+        self._record(started, None, background)
+        return result
+    
+    async def _call(self, runnable, inputs: dict) -> Any:
+        semaphore = self._get_semaphore()
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            return await runnable.ainvoke(inputs)
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+    
+    async def astream(self, runnable, inputs: Optional[dict] = None) -> AsyncIterator[Any]:
+        """Yield ``runnable.astream`` chunks under the same limit, deadline and breaker"""
+        self._admit()
+        self.calls += 1
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        deadline = loop.time() + self.timeout_seconds
+        semaphore = self._get_semaphore()
+        acquired = False
+        try:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.timeout_seconds)
+                acquired = True
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            iterator = runnable.astream(inputs or {}).__aiter__()
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+                yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            self.breaker.release_probe()
+            raise
+        except asyncio.TimeoutError as e:
+            self.timeouts += 1
+            self._record(started, e)
+            raise LLMUnavailableError(f"LLM stream exceeded {self.timeout_seconds}s deadline") from e
+        except Exception as e:
+            self.failures += 1
+            self._record(started, e)
+            raise LLMUnavailableError(f"LLM stream failed: {e}") from e
+        else:
+            self._record(started, None)
+        finally:
+            if acquired:
+                self.in_flight -= 1
+                semaphore.release()
+    
+    def stats(self) -> dict:
+        ordered = sorted(self.latencies)
+        
+        def pct(p: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3) if ordered else 0.0
+        
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "background_calls": self.background_calls,
+            "latency_seconds": {"p50": pct(0.50), "p95": pct(0.95), "max": pct(1.0)},
+            "breaker": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.consecutive_failures,
+                "trips": self.breaker.trips
+            }
+        }
+
+# Singleton instance
+llm_gateway = LLMGateway(
+    max_concurrency=settings.OLLAMA_MAX_CONCURRENCY,
+    timeout_seconds=settings.OLLAMA_TIMEOUT_SECONDS,
+    slow_call_seconds=settings.OLLAMA_SLOW_CALL_SECONDS,
+    breaker=CircuitBreaker(
+        failure_threshold=settings.OLLAMA_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout_seconds=settings.OLLAMA_BREAKER_RESET_SECONDS
+    )
+)
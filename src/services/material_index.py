@@ -0,0 +1,146 @@
+"""
+Per-material vector index used to ground learning verification
+"""
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+from src.core.config import settings
+from src.services.quiz_service import quiz_service
+
+logger = logging.getLogger(__name__)
+
+def extract_material_text(material: dict) -> str:
+    """Plain text of a material: inline content plus extracted PDF / text file content"""
+    parts = []
+    if material.get("content"):
+        parts.append(material["content"])
+    file_rel = material.get("file_path")
+    if file_rel:
+        file_abs = Path(settings.UPLOAD_DIR).parent / file_rel
+        suffix = file_abs.suffix.lower()
+        try:
+            if suffix == ".pdf":
+                from PyPDF2 import PdfReader  # type: ignore
+                reader = PdfReader(str(file_abs))
+                parts.extend(page.extract_text() or "" for page in reader.pages)
+            elif suffix == ".txt":
+                parts.append(file_abs.read_text(encoding="utf-8", errors="ignore"))
+        except Exception as e:
+            logger.warning("Text extraction failed for %s: %s", file_abs, e)
+    return "\n".join(p for p in parts if p)
+
+def chunk_text(text: str, chunk_words: int, overlap_words: int) -> List[str]:
+    """Split text into overlapping word windows"""
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, chunk_words - overlap_words)
+    return [" ".join(words[i:i + chunk_words]) for i in range(0, max(1, len(words) - overlap_words), step)]
+
+class MaterialIndex:
+    """Chunk embeddings stored per material as a memory-mapped float16 matrix.
+    
+    ``<id>.f16`` holds unit-normalized chunk vectors (count x dim) and
+    ``<id>.json`` the chunk texts plus model metadata; the JSON is written last,
+    so its presence marks a complete index (``count: 0`` when there was no text).
+    File reads, scoring against the memory-mapped matrix and unlinks run in
+    worker threads, never on the event loop.
+    """
+    
+    def __init__(self):
+        self.index_dir = Path(settings.VECTOR_INDEX_DIR)
+    
+    def _paths(self, material_id: str):
+        return self.index_dir / f"{material_id}.f16", self.index_dir / f"{material_id}.json"
+    
+    async def _load_meta(self, material_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self._read_meta, material_id)
+    
+    def _read_meta(self, material_id: str) -> Optional[dict]:
+        _, meta_path = self._paths(material_id)
+        try:
+            meta = json.loads(meta_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        return meta if meta.get("model") == quiz_service.embedding_model else None
+    
+    async def ingest(self, material: dict, text: Optional[str] = None) -> int:
+        """Chunk and embed a material; returns the number of chunks indexed.
+        ``text`` is already-extracted file text (otherwise extracted here)."""
+        if text is None:
+            text = await asyncio.to_thread(extract_material_text, material)
+        else:
+            text = "\n".join(p for p in (material.get("content"), text) if p)
+        chunks = chunk_text(text, settings.VERIFY_CHUNK_WORDS, settings.VERIFY_CHUNK_OVERLAP_WORDS)
+        if chunks:
+            # Through the shared batcher: the model only ever runs on its single worker thread
+            matrix = np.asarray(np.stack(await quiz_service.embedding_batcher.encode_many(chunks)), dtype=np.float16)
+        else:
+            # Nothing to retrieve (scanned PDF, video, empty text); remembered so it is not re-extracted
+            matrix = np.zeros((0, 0), dtype=np.float16)
+        meta = {
+            "model": quiz_service.embedding_model,
+            "count": int(matrix.shape[0]),
+            "dim": int(matrix.shape[1]),
+            "chunks": chunks
+        }
+        await asyncio.to_thread(self._write, material["_id"], matrix, meta)
+        return len(chunks)
+    
+    def _write(self, material_id: str, matrix: np.ndarray, meta: dict) -> None:
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        matrix_path, meta_path = self._paths(material_id)
+        for path, data in ((matrix_path, matrix.tobytes()), (meta_path, json.dumps(meta).encode("utf-8"))):
+            tmp = path.with_suffix(path.suffix + ".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+    
+    async def remove(self, material_id: str) -> None:
+        await asyncio.to_thread(self._remove, material_id)
+    
+    def _remove(self, material_id: str) -> None:
+        for path in self._paths(material_id):
+            path.unlink(missing_ok=True)
+    
+    async def retrieve(self, material_id: str, query: str, k: int, meta: Optional[dict] = None) -> List[str]:
+        """Top-k chunks by cosine similarity to the query. Pass ``meta`` when the
+        caller has already loaded it, so the JSON is read once per request."""
+        if meta is None:
+            meta = await self._load_meta(material_id)
+        if meta is None or meta["count"] == 0:
+            return []
+        query_vec = np.asarray(await quiz_service.embedding_batcher.encode(query), dtype=np.float32)
+        return await asyncio.to_thread(self._top_chunks, material_id, meta, query_vec, k)
+    
+    def _top_chunks(self, material_id: str, meta: dict, query_vec: np.ndarray, k: int) -> List[str]:
+        matrix_path, _ = self._paths(material_id)
+        matrix = np.memmap(matrix_path, dtype=np.float16, mode="r", shape=(meta["count"], meta["dim"]))
+        scores = matrix @ query_vec
+        k = min(k, meta["count"])
+        top = np.argpartition(-scores, k - 1)[:k]
+        # Keep document order so the excerpt reads naturally
+        return [meta["chunks"][i] for i in sorted(top)]
+    
+    async def is_indexed(self, material_id: str) -> bool:
+        return await self._load_meta(material_id) is not None
+    
+    async def verification_context(self, material: dict) -> str:
+        """Bounded excerpt for the verification prompt. A material without an index is
+        queued for background indexing and verified against its inline content meanwhile."""
+        meta = await self._load_meta(material["_id"])
+        chunks = []
+        if meta is None:
+            from src.services.material_processing import material_processor
+            material_processor.enqueue_index(material)
+        else:
+            query = f"{material.get('title', '')}\n{material.get('description', '')}"
+            chunks = await self.retrieve(material["_id"], query, settings.VERIFY_TOP_K, meta=meta)
+        context = "\n---\n".join(chunks) if chunks else (material.get("content") or "")
+        return context[:settings.VERIFY_MAX_CONTEXT_CHARS] or "Content not available"
+
+# Singleton instance
+material_index = MaterialIndex()
@@ -0,0 +1,133 @@
+"""
+Background processing pipeline for uploaded materials
+"""
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Set
+from src.core.config import settings
+from src.core.database import get_materials_collection
+from src.services.material_index import material_index
+from src.utils.file_processing import process_material_file
+
+logger = logging.getLogger(__name__)
+
+class MaterialProcessor:
+    """Runs page counting, text extraction, hashing and thumbnails off the request path.
+    
+    Heavy work runs on a process pool (spawned, so workers never inherit model
+    threads); results are written back to the material document and its
+    ``processing_status`` moves queued -> processing -> ready | failed.
+    Materials left queued/processing by a restart are picked up by resume_pending().
+    """
+    
+    def __init__(self):
+        self.materials_collection = get_materials_collection()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._indexing: Set[str] = set()
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.MATERIAL_PROCESSING_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+    
+    def enqueue(self, material_id: str) -> None:
+        """Schedule processing; returns immediately"""
+        task = asyncio.get_running_loop().create_task(self._process(material_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    def enqueue_index(self, material: dict) -> None:
+        """Build a missing vector index in the background (materials indexed before the
+        current embedding model, or never). No-op while the material is being processed."""
+        material_id = material["_id"]
+        if material_id in self._indexing or material.get("processing_status") in ("queued", "processing"):
+            return
+        self._indexing.add(material_id)
+        task = asyncio.get_running_loop().create_task(self._index(material_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _index(self, material_id: str) -> None:
+        try:
+            material = await self.materials_collection.find_one({"_id": material_id})
+            if material is not None:
+                await material_index.ingest(material)
+        except Exception as e:
+            logger.warning("Indexing failed for material %s: %s", material_id, e)
+        finally:
+            self._indexing.discard(material_id)
+    
+    async def resume_pending(self) -> int:
+        cursor = self.materials_collection.find(
+            {"processing_status": {"$in": ["queued", "processing"]}}, {"_id": 1}
+        )
+        count = 0
+        async for mat in cursor:
+            self.enqueue(mat["_id"])
+            count += 1
+        return count
+    
+    async def _process(self, material_id: str) -> None:
+        material = await self.materials_collection.find_one_and_update(
+            {"_id": material_id},
+            {"$set": {"processing_status": "processing", "processing_started_at": datetime.utcnow()}}
+        )
+        if material is None:
+            return
+        try:
+            updates = {}
+            text = None
+            file_rel = material.get("file_path")
+            if file_rel:
+                file_abs = Path(settings.UPLOAD_DIR).parent / file_rel
+                is_pdf = file_abs.suffix.lower() == ".pdf" or material.get("content_type", "").lower() == "pdf"
+                thumbnail_rel = f"thumbnails/{material_id}.png"
+                thumbnail_abs = Path(settings.UPLOAD_DIR).parent / thumbnail_rel
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self._get_executor(), process_material_file,
+                    str(file_abs), is_pdf, str(thumbnail_abs) if is_pdf else None,
+                    not material.get("sha256")  # hashed while streaming the upload
+                )
+                text = result["text"]
+                updates.update({
+                    "sha256": material.get("sha256") or result["sha256"],
+                    "file_size": result["file_size"],
+                    "total_pages": result["total_pages"],
+                    "thumbnail_path": thumbnail_rel if result["thumbnail_created"] else None
+                })
+                if result["file_digests"]:
+                    updates["file_digests"] = result["file_digests"]
+            
+            await material_index.ingest({**material, **updates}, text=text)
+            await self.materials_collection.update_one(
+                {"_id": material_id},
+                {"$set": {**updates, "processing_status": "ready", "processed_at": datetime.utcnow()},
+                 "$unset": {"processing_error": ""}}
+            )
+        except Exception as e:
+            logger.warning("Processing failed for material %s: %s", material_id, e)
+            await self.materials_collection.update_one(
+                {"_id": material_id},
+                {"$set": {"processing_status": "failed", "processing_error": str(e)}}
+            )
+    
+    async def shutdown(self) -> None:
+        """Cancel in-flight work (it resumes on next start) and stop the workers"""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Singleton instance
+material_processor = MaterialProcessor()
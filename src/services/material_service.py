@@ -2,13 +2,23 @@
 Materials management service
 """
 from fastapi import HTTPException, UploadFile, File
-from typing import List, Optional
+from typing import List, Optional, Tuple
+import asyncio
+import os
 import uuid
-import shutil
 from pathlib import Path
-from src.core.database import get_materials_collection, get_users_collection, get_progress_collection
-from src.core.models import Material, MaterialCreate, User
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from src.core.database import db, get_materials_collection, get_users_collection, get_progress_collection
+from src.core.models import BulkEnrollment, Material, MaterialCreate, User
 from src.core.config import settings
+from src.services.auth_service import auth_service
+from src.services.material_index import material_index
+from src.services.blob_store import blob_store
+from src.services.job_service import job_service
+from src.services.progress_service import pages_to_words
+from src.services.upload_service import upload_service
+from src.utils.file_processing import digest_file
 from datetime import datetime
 
 class MaterialService:
@@ -18,8 +28,10 @@ class MaterialService:
         self.materials_collection = get_materials_collection()
         self.users_collection = get_users_collection()
         self.progress_collection = get_progress_collection()
+        job_service.register("material_cascade", self._run_cascade_job)
+        job_service.register("bulk_enroll", self._run_bulk_enroll)
     
-    def create_material(
+    async def create_material(
         self, 
         title: str, 
         description: str, 
@@ -27,45 +39,19 @@ class MaterialService:
         content_type: str,
         user_id: str,
         file: Optional[UploadFile] = None,
-        content: Optional[str] = None
+        content: Optional[str] = None,
+        upload_id: Optional[str] = None
     ) -> Material:
         """Create a new learning material"""
         material_id = str(uuid.uuid4())
-        file_path = None
-        
-        if file:
-            # Save uploaded file
-            upload_dir = Path(settings.UPLOAD_DIR)
-            upload_dir.mkdir(parents=True, exist_ok=True)
-            filename = f"{material_id}_{file.filename}"
-            file_path = upload_dir / filename
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-
-            # Basic PDF validation if content_type is pdf or filename endswith .pdf
-            total_pages = None
-            if (content_type.lower() == "pdf" or (file.filename.lower().endswith(".pdf"))):
-                try:
-                    with open(file_path, "rb") as f:
-                        header = f.read(8)
-                    if not header.startswith(b"%PDF"):
-                        # Remove invalid file and abort
-                        file_path.unlink(missing_ok=True)
-                        raise HTTPException(status_code=400, detail="Uploaded file is not a valid PDF (missing %PDF header). Please export or re-save the document as a PDF and retry.")
-                    # Attempt page count if PyPDF2 available
-                    try:
-                        from PyPDF2 import PdfReader  # type: ignore
-                        reader = PdfReader(str(file_path))
-                        total_pages = len(reader.pages)
-                    except Exception:
-                        total_pages = None
-                except HTTPException:
-                    raise
-                except Exception as e:
-                    file_path.unlink(missing_ok=True)
-                    raise HTTPException(status_code=400, detail=f"Failed to validate PDF: {e}")
-        else:
-            total_pages = None
+        stored = None
+        if upload_id:
+            # Resumable upload already streamed to disk
+            stored = await upload_service.finalize(upload_id, user_id)
+        elif file:
+            # Streamed in chunks with size cap, type sniffing and SHA-256;
+            # page counting, text extraction and thumbnails run in the background
+            stored = await upload_service.save_upload_file(file, material_id)
         
         material_doc = {
             "_id": material_id,
@@ -73,149 +59,382 @@ class MaterialService:
             "description": description,
             "department": department,
             "content_type": content_type,
-            "file_path": f"materials/{filename}" if file else None,
+            "file_path": None,
             "content": content,
             "uploaded_by": user_id,
             "uploaded_at": datetime.utcnow(),
-            "total_pages": total_pages
+            "total_pages": None,
+            "processing_status": "queued"
         }
+        if stored:
+            # file_path, file_name, sha256, size, mtime and header flags (refreshed by FileReconciler)
+            material_doc.update(stored)
         
-        self.materials_collection.insert_one(material_doc)
+        try:
+            await self.materials_collection.insert_one(material_doc)
+        except Exception:
+            if stored:
+                await blob_store.release(stored["sha256"])
+            raise
         return Material(**{**material_doc, "id": material_id})
     
-    def get_materials(self, department: Optional[str] = None) -> List[Material]:
+    async def get_materials(self, department: Optional[str] = None) -> List[Material]:
         """Get all materials, optionally filtered by department"""
         query = {}
         if department:
             query["department"] = department
         
-        materials = list(self.materials_collection.find(query))
+        materials = await self.materials_collection.find(query).to_list(length=None)
         annotated: List[Material] = []
         for mat in materials:
             annotated.append(self._build_material_with_file_flags(mat))
         return annotated
     
-    def get_material_by_id(self, material_id: str) -> Optional[dict]:
+    async def get_processing_status(self, material_id: str) -> dict:
+        """Processing state of a material's background pipeline"""
+        material = await self.materials_collection.find_one(
+            {"_id": material_id},
+            {"processing_status": 1, "processing_error": 1, "total_pages": 1, "thumbnail_path": 1, "processed_at": 1}
+        )
+        if not material:
+            raise HTTPException(status_code=404, detail="Material not found")
+        return {
+            "material_id": material_id,
+            # Materials created before the pipeline existed were processed inline
+            "processing_status": material.get("processing_status", "ready"),
+            "processing_error": material.get("processing_error"),
+            "total_pages": material.get("total_pages"),
+            "thumbnail_path": material.get("thumbnail_path"),
+            "processed_at": material.get("processed_at")
+        }
+    
+    async def resolve_material_file(self, material_id: str) -> Tuple[dict, Path, os.stat_result]:
+        """Material document, absolute file path and a fresh stat() of its stored file"""
+        material = await self.materials_collection.find_one({"_id": material_id})
+        if not material or not material.get("file_path"):
+            raise HTTPException(status_code=404, detail="File not found for material")
+        # material['file_path'] is relative to the uploads root, e.g. blobs/ab/<sha256>.pdf
+        file_abs = Path(settings.UPLOAD_DIR).parent / material["file_path"]
+        try:
+            st = await asyncio.to_thread(file_abs.stat)
+        except OSError:
+            raise HTTPException(status_code=404, detail="Stored file missing on disk")
+        return material, file_abs, st
+    
+    @staticmethod
+    def file_etag(material: dict, st: os.stat_result) -> str:
+        """Content SHA-256 while the stored digests still describe the file, else size+mtime"""
+        digests = material.get("file_digests") or {}
+        if digests.get("size") == st.st_size and digests.get("mtime") == st.st_mtime:
+            return digests["sha256"]
+        return f"{st.st_size:x}-{st.st_mtime_ns:x}"
+    
+    async def get_file_info(self, material_id: str) -> dict:
+        """Diagnostic info about the stored file (size, digests, header bytes).
+        Digests are computed at upload/processing time and recomputed here only
+        when the file's size or mtime no longer match them."""
+        material, file_abs, st = await self.resolve_material_file(material_id)
+        digests = material.get("file_digests") or {}
+        if digests.get("size") != st.st_size or digests.get("mtime") != st.st_mtime:
+            digests = await asyncio.to_thread(digest_file, str(file_abs))
+            await self.materials_collection.update_one({"_id": material_id}, {"$set": {"file_digests": digests}})
+        
+        header = bytes.fromhex(digests["header_hex"])
+        data = {
+            "material_id": material_id,
+            "file_name": material.get("file_name") or file_abs.name,
+            "file_path": str(file_abs),
+            "size_bytes": digests["size"],
+            "is_pdf": file_abs.suffix.lower() == ".pdf",
+            # MD5 for quick diagnostic purposes, not for security
+            "md5": digests["md5"],
+            "sha256": digests["sha256"],
+            "header_hex": header.hex(),
+            "header_ascii": ''.join(chr(b) if 32 <= b <= 126 else '.' for b in header)
+        }
+        if material.get("sha256"):
+            data["content_matches_upload"] = digests["sha256"] == material["sha256"]
+        # Expected PDF header starts with %PDF
+        if data["is_pdf"]:
+            data["pdf_header_valid"] = header.startswith(b"%PDF")
+        return data
+    
+    async def get_material_by_id(self, material_id: str) -> Optional[dict]:
         """Get a single material by ID"""
-        material = self.materials_collection.find_one({"_id": material_id})
+        material = await self.materials_collection.find_one({"_id": material_id})
         return material
     
-    def get_enrolled_materials(self, user: User) -> List[Material]:
+    async def get_enrolled_materials(self, user: User) -> List[Material]:
         """Get materials the user is enrolled in"""
         if not user.enrolled_materials:
             return []
         
-        materials = list(self.materials_collection.find({"_id": {"$in": user.enrolled_materials}}))
+        materials = await self.materials_collection.find({"_id": {"$in": user.enrolled_materials}}).to_list(length=None)
         annotated: List[Material] = []
         for mat in materials:
             annotated.append(self._build_material_with_file_flags(mat))
         return annotated
     
-    def enroll_user(self, material_id: str, user: User) -> dict:
-        """Enroll a user in a material"""
-        material = self.materials_collection.find_one({"_id": material_id})
-        if not material:
-            raise HTTPException(status_code=404, detail="Material not found")
-        
-        if material_id not in user.enrolled_materials:
-            self.users_collection.update_one(
-                {"_id": user.id},
-                {"$push": {"enrolled_materials": material_id}}
-            )
-            # Initialize progress
-            self.progress_collection.insert_one({
+    @staticmethod
+    def _progress_seed(material: dict, user_id: str) -> UpdateOne:
+        """Upsert of a fresh progress record; a no-op when the user already has one.
+        The (user_id, material_id) unique index makes concurrent enrollments safe."""
+        now = datetime.utcnow()
+        return UpdateOne(
+            {"user_id": user_id, "material_id": material["_id"]},
+            {"$setOnInsert": {
                 "_id": str(uuid.uuid4()),
-                "user_id": user.id,
-                "material_id": material_id,
                 "progress_percentage": 0.0,
                 "completed_sections": [],
-                "completed_pages": [],
-                "started_at": datetime.utcnow(),
-                "last_updated": datetime.utcnow()
-            })
+                # Page bitmap sized up front so page marks take the single-update fast path
+                "total_pages": material.get("total_pages"),
+                "completed_pages_bits": pages_to_words([], material.get("total_pages") or 0),
+                "completed_pages_count": 0,
+                "started_at": now,
+                "last_updated": now
+            }},
+            upsert=True
+        )
+
+    async def _seed_progress(self, material: dict, user_ids: List[str]) -> None:
+        try:
+            await self.progress_collection.bulk_write(
+                [self._progress_seed(material, user_id) for user_id in user_ids], ordered=False
+            )
+        except BulkWriteError as e:
+            # A racing upsert of the same (user, material) lost to the unique index: already seeded
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+
+    async def enroll_user(self, material_id: str, user: User) -> dict:
+        """Enroll a user in a material (idempotent: repeated or concurrent calls enroll once)"""
+        material = await self.materials_collection.find_one({"_id": material_id}, {"total_pages": 1})
+        if not material:
+            raise HTTPException(status_code=404, detail="Material not found")
+        
+        result = await self.users_collection.update_one(
+            {"_id": user.id},
+            {"$addToSet": {"enrolled_materials": material_id}}
+        )
+        await self._seed_progress(material, [user.id])
+        if not await self.materials_collection.count_documents({"_id": material_id}, limit=1):
+            # Deleted while enrolling; its cascade may have run before these writes
+            await self._undo_enrollment(material_id, [user.id])
+            auth_service.invalidate_user(user.id)
+            raise HTTPException(status_code=404, detail="Material not found")
+        if result.modified_count:
+            auth_service.invalidate_user(user.id)
         
         return {"message": "Successfully enrolled in material"}
 
-    def delete_material(self, material_id: str, user: User) -> dict:
+    async def _undo_enrollment(self, material_id: str, user_ids: List[str]) -> None:
+        await self.progress_collection.delete_many({"material_id": material_id, "user_id": {"$in": user_ids}})
+        await self.users_collection.update_many(
+            {"_id": {"$in": user_ids}},
+            {"$pull": {"enrolled_materials": material_id}}
+        )
+
+    async def bulk_enroll(self, material_id: str, cohort: BulkEnrollment, user: User) -> dict:
+        """Enroll a department or a list of users in a background job; returns the job"""
+        material = await self.materials_collection.find_one({"_id": material_id}, {"uploaded_by": 1})
+        if not material:
+            raise HTTPException(status_code=404, detail="Material not found")
+        if material.get("uploaded_by") != user.id and user.role != "admin":
+            raise HTTPException(status_code=403, detail="Not authorized to enroll users in this material")
+        if (cohort.department is None) == (cohort.user_ids is None):
+            raise HTTPException(status_code=400, detail="Provide either department or user_ids")
+
+        params = {"material_id": material_id, "department": cohort.department, "user_ids": cohort.user_ids}
+        total = await self.users_collection.count_documents(self._cohort_query(params))
+        job = await job_service.submit("bulk_enroll", params, user.id, total=total)
+        return {"job_id": job["_id"], "total": total}
+
+    @staticmethod
+    def _cohort_query(params: dict, after: Optional[str] = None) -> dict:
+        query = (
+            {"department": params["department"]}
+            if params.get("department") is not None
+            else {"_id": {"$in": params["user_ids"]}}
+        )
+        if after is not None:
+            query["_id"] = {**query.get("_id", {}), "$gt": after}
+        return query
+
+    async def _run_bulk_enroll(self, job: dict) -> None:
+        """Enroll the cohort JOB_CHUNK_SIZE users at a time in _id order.
+
+        Each chunk is one $addToSet update_many plus one unordered bulk_write of
+        progress upserts, so re-running a chunk changes nothing; the last _id is
+        stored as the job cursor and an interrupted job continues after it.
+        """
+        params = job["params"]
+        material_id = params["material_id"]
+        cursor = job.get("cursor")
+        while True:
+            # Re-read per chunk: once the material is deleted (and its cascade has run)
+            # nothing may enroll users in it again
+            material = await self.materials_collection.find_one({"_id": material_id}, {"total_pages": 1})
+            if not material:
+                raise RuntimeError("Material was deleted")
+            chunk = await self.users_collection.find(
+                self._cohort_query(params, cursor), {"_id": 1}
+            ).sort("_id", 1).limit(settings.JOB_CHUNK_SIZE).to_list(length=None)
+            if not chunk:
+                break
+            user_ids = [u["_id"] for u in chunk]
+            await self.users_collection.update_many(
+                {"_id": {"$in": user_ids}},
+                {"$addToSet": {"enrolled_materials": material_id}}
+            )
+            await self._seed_progress(material, user_ids)
+            deleted = not await self.materials_collection.count_documents({"_id": material_id}, limit=1)
+            if deleted:
+                # Deleted while this chunk was written; the cascade may have missed these users
+                await self._undo_enrollment(material_id, user_ids)
+            for user_id in user_ids:
+                auth_service.invalidate_user(user_id)
+            if deleted:
+                raise RuntimeError("Material was deleted")
+            cursor = user_ids[-1]
+            await job_service.report(job["_id"], len(user_ids), cursor=cursor)
+
+    async def delete_material(self, material_id: str, user: User) -> dict:
         """Delete a material (only uploader). Removes file and related progress/enrollments."""
-        material = self.materials_collection.find_one({"_id": material_id})
+        material = await self.materials_collection.find_one({"_id": material_id})
         if not material:
             raise HTTPException(status_code=404, detail="Material not found")
         if material.get("uploaded_by") != user.id:
             raise HTTPException(status_code=403, detail="Not authorized to delete this material")
 
-        # Remove file if exists
-        file_rel = material.get("file_path")  # e.g. materials/<file>
-        if file_rel:
-            uploads_root = Path(settings.UPLOAD_DIR).parent
-            file_abs = uploads_root / file_rel
-            try:
-                if file_abs.exists():
-                    file_abs.unlink()
-            except Exception:
-                # Non-fatal; continue
-                pass
-
-        # Remove progress entries
-        self.progress_collection.delete_many({"material_id": material_id})
-        # Pull from enrolled_materials for all users
-        self.users_collection.update_many({}, {"$pull": {"enrolled_materials": material_id}})
-        # Delete the material document
-        self.materials_collection.delete_one({"_id": material_id})
+        return await self._delete_with_cascade(material, user.id, "Material deleted")
 
-        return {"message": "Material deleted"}
-
-    def force_delete_material(self, material_id: str) -> dict:
+    async def force_delete_material(self, material_id: str, user: Optional[User] = None) -> dict:
         """Force delete a material regardless of uploader (used for ghost entries with missing files)."""
-        material = self.materials_collection.find_one({"_id": material_id})
+        material = await self.materials_collection.find_one({"_id": material_id})
         if not material:
             raise HTTPException(status_code=404, detail="Material not found")
-        # Attempt file removal if still present
-        file_rel = material.get("file_path")
-        if file_rel:
-            uploads_root = Path(settings.UPLOAD_DIR).parent
-            file_abs = uploads_root / file_rel
+        return await self._delete_with_cascade(material, user.id if user else None, "Material force-deleted")
+
+    async def _delete_with_cascade(self, material: dict, user_id: Optional[str], message: str) -> dict:
+        """Delete the material with its progress records and enrollment references.
+
+        Only users enrolled in the material are touched (enrolled_materials
+        index). The material document always goes first, so no enrollment can be
+        added during the cleanup. Small cohorts are then cleaned up in one
+        transaction (or in order on a standalone server) before responding;
+        larger ones, or a small one whose cleanup failed, in a background job so
+        the request stays fast.
+        """
+        material_id = material["_id"]
+        query = {"enrolled_materials": material_id}
+        enrolled = await self.users_collection.count_documents(query, limit=settings.CASCADE_INLINE_LIMIT + 1)
+        result = {"message": message}
+        if enrolled > settings.CASCADE_INLINE_LIMIT:
+            job = await job_service.create(
+                "material_cascade",
+                {"material_id": material_id},
+                user_id,
+                total=await self.users_collection.count_documents(query)
+            )
+            # No new enrollments once the document is gone (enroll_user checks it). The job is
+            # recorded first so a crash here still leaves it to resume; it only runs once the
+            # document is gone (see _run_cascade_job)
             try:
-                if file_abs.exists():
-                    file_abs.unlink()
+                await self.materials_collection.delete_one({"_id": material_id})
             except Exception:
-                pass
-        # Remove progress entries and enrollment references
-        self.progress_collection.delete_many({"material_id": material_id})
-        self.users_collection.update_many({}, {"$pull": {"enrolled_materials": material_id}})
-        self.materials_collection.delete_one({"_id": material_id})
-        return {"message": "Material force-deleted"}
+                await job_service.cancel(job["_id"], "Material delete failed")
+                raise
+            job_service.start(job)
+            result["job_id"] = job["_id"]
+        else:
+            await self.materials_collection.delete_one({"_id": material_id})
+
+            async def cascade(session) -> List[str]:
+                user_ids = await self._enrolled_user_ids(material_id, session=session)
+                await self.progress_collection.delete_many({"material_id": material_id}, session=session)
+                if user_ids:
+                    await self.users_collection.update_many(
+                        {"_id": {"$in": user_ids}},
+                        {"$pull": {"enrolled_materials": material_id}},
+                        session=session
+                    )
+                return user_ids
+
+            try:
+                user_ids = await db.run_in_transaction(cascade)
+            except Exception:
+                # The document is already gone: finish the cleanup in the resumable job
+                job = await job_service.submit("material_cascade", {"material_id": material_id}, user_id, total=enrolled)
+                result["job_id"] = job["_id"]
+            else:
+                for enrolled_user_id in user_ids:
+                    auth_service.invalidate_user(enrolled_user_id)
+
+        # Files go once the document is gone, so a failed cascade leaves them intact
+        await self._remove_material_files(material)
+        await material_index.remove(material_id)
+        return result
+
+    async def _enrolled_user_ids(self, material_id: str, limit: int = 0, session=None) -> List[str]:
+        cursor = self.users_collection.find(
+            {"enrolled_materials": material_id}, {"_id": 1}, session=session
+        ).limit(limit)
+        return [u["_id"] async for u in cursor]
+
+    async def _run_cascade_job(self, job: dict) -> None:
+        """Remove enrollments and progress of a deleted material, JOB_CHUNK_SIZE users at a time.
+        Finished users drop out of the query, so an interrupted job simply resumes."""
+        material_id = job["params"]["material_id"]
+        if await self.materials_collection.count_documents({"_id": material_id}, limit=1):
+            raise RuntimeError("Material still exists; enrollments left untouched")
+
+        async def cascade_chunk(session) -> List[str]:
+            user_ids = await self._enrolled_user_ids(material_id, settings.JOB_CHUNK_SIZE, session)
+            if user_ids:
+                await self.progress_collection.delete_many(
+                    {"material_id": material_id, "user_id": {"$in": user_ids}}, session=session
+                )
+                await self.users_collection.update_many(
+                    {"_id": {"$in": user_ids}},
+                    {"$pull": {"enrolled_materials": material_id}},
+                    session=session
+                )
+            return user_ids
+
+        while True:
+            user_ids = await db.run_in_transaction(cascade_chunk)
+            if not user_ids:
+                break
+            for user_id in user_ids:
+                auth_service.invalidate_user(user_id)
+            await job_service.report(job["_id"], len(user_ids))
+        # Progress records left without an enrollment
+        await self.progress_collection.delete_many({"material_id": material_id})
 
     # Internal helpers
-    def _build_material_with_file_flags(self, mat: dict) -> Material:
-        """Construct Material with file existence and PDF header validation flags."""
-        from pathlib import Path
-        file_exists = None
-        pdf_header_valid = None
-        file_rel = mat.get("file_path")
-        if file_rel:
+    async def _remove_material_files(self, material: dict) -> None:
+        """Drop the material's blob reference (unlinked with the last one) and its thumbnail.
+        Files stored before the blob store existed are unlinked directly."""
+        uploads_root = Path(settings.UPLOAD_DIR).parent
+        file_rel = material.get("file_path")  # e.g. blobs/ab/<sha256>.pdf or legacy materials/<file>
+        paths = [material.get("thumbnail_path")]
+        if file_rel and material.get("sha256") and file_rel.startswith("blobs/"):
+            await blob_store.release(material["sha256"])
+        else:
+            paths.append(file_rel)
+        for rel in paths:
+            if not rel:
+                continue
             try:
-                uploads_root = Path(settings.UPLOAD_DIR).parent  # 'uploads'
-                file_abs = uploads_root / file_rel
-                if file_abs.exists():
-                    file_exists = True
-                    # Only attempt PDF header validation if seems to be pdf
-                    if str(file_abs).lower().endswith('.pdf'):
-                        try:
-                            with open(file_abs, 'rb') as f:
-                                header = f.read(8)
-                            pdf_header_valid = header.startswith(b'%PDF')
-                        except Exception:
-                            pdf_header_valid = False
-                else:
-                    file_exists = False
-                    if str(file_rel).lower().endswith('.pdf'):
-                        pdf_header_valid = False
+                (uploads_root / rel).unlink(missing_ok=True)
             except Exception:
-                file_exists = False
-                if file_rel.lower().endswith('.pdf'):
-                    pdf_header_valid = False
-        return Material(**{**mat, "id": mat["_id"], "file_exists": file_exists, "pdf_header_valid": pdf_header_valid, "total_pages": mat.get("total_pages")})
+                # Non-fatal; continue
+                pass
+    
+    def _build_material_with_file_flags(self, mat: dict) -> Material:
+        """Construct Material from the cached file flags on the document (no filesystem I/O).
+        Flags are set at upload and kept current by the background FileReconciler."""
+        return Material(**{**mat, "id": mat["_id"]})
 
 # Singleton instance
 material_service = MaterialService()
@@ -0,0 +1,233 @@
+"""
+Write-coalescing buffer for batched progress updates
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set, Tuple
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from src.core.config import settings
+from src.core.database import get_progress_collection
+from src.core.models import ProgressBatchItem
+from src.services.progress_service import MAX_PAGE_NUMBER, page_marks_update, progress_service
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, str]  # (user_id, material_id)
+
+class ProgressWriteBuffer:
+    """Coalesces page marks and reading heartbeats per (user, material) and
+    writes them with one unordered bulk_write.
+
+    Durability: a batch is acknowledged (202) once it is held in this process's
+    memory. It reaches MongoDB within PROGRESS_FLUSH_INTERVAL_SECONDS (sooner once
+    PROGRESS_BUFFER_MAX_KEYS keys are pending) and is flushed on graceful
+    shutdown, so a crash loses at most the last interval. Page marks are
+    idempotent and safe to resend; reading time is best effort. Writes that
+    fail are merged back and retried on the next flush, up to MAX_ATTEMPTS.
+    """
+
+    # Pages one buffered key may hold; further marks wait for the (early) flush
+    MAX_PAGES_PER_KEY = 2000
+    # Flushes a write may fail before its key is dropped
+    MAX_ATTEMPTS = 3
+
+    def __init__(self):
+        self.progress_collection = get_progress_collection()
+        self._pending: Dict[Key, dict] = {}
+        self._inflight: Dict[Key, dict] = {}
+        self._replaying: Dict[Key, Set[int]] = {}
+        self._lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.events = 0
+        self.flushes = 0
+        self.ops_written = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self.dropped = 0
+        self.pages_dropped = 0
+
+    def _merge(self, entry: dict, pages, seconds: float, current_page: Optional[int]) -> None:
+        for page in pages:
+            if len(entry["pages"]) >= self.MAX_PAGES_PER_KEY and page not in entry["pages"]:
+                self.pages_dropped += 1
+                continue
+            entry["pages"].add(page)
+        entry["seconds"] += seconds
+        if current_page:
+            entry["current_page"] = current_page
+
+    def _entry(self, key: Key) -> dict:
+        return self._pending.setdefault(
+            key, {"pages": set(), "seconds": 0.0, "current_page": None, "attempts": 0}
+        )
+
+    def add(self, user_id: str, item: ProgressBatchItem) -> None:
+        """Buffer one item; triggers an early flush when too many keys (or pages) are pending"""
+        entry = self._entry((user_id, item.material_id))
+        self._merge(entry, (p for p in item.completed_pages if 1 <= p <= MAX_PAGE_NUMBER), item.reading_seconds, item.current_page)
+        self.events += 1
+        if (
+            len(self._pending) >= settings.PROGRESS_BUFFER_MAX_KEYS
+            or len(entry["pages"]) >= self.MAX_PAGES_PER_KEY
+        ) and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    def buffered_material_ids(self, user_id: str) -> Set[str]:
+        """Materials of the user with page marks not yet visible in MongoDB"""
+        ids = {material_id for (uid, material_id) in self._replaying if uid == user_id}
+        for source in (self._inflight, self._pending):
+            ids |= {material_id for (uid, material_id), entry in source.items() if uid == user_id and entry["pages"]}
+        return ids
+
+    def overlay(self, user_id: str, material_id: str, progress: dict) -> dict:
+        """Read-your-writes: merge not-yet-flushed page marks into a progress view
+        (completed_pages, completed_pages_count and progress_percentage)"""
+        key = (user_id, material_id)
+        buffered = set(self._replaying.get(key, ()))
+        for source in (self._inflight, self._pending):
+            if key in source:
+                buffered |= source[key]["pages"]
+        if not buffered:
+            return progress
+        total_pages = progress.get("total_pages")
+        pages = set(progress.get("completed_pages") or [])
+        pages |= {p for p in buffered if not total_pages or p <= total_pages}
+        view = {**progress, "completed_pages": sorted(pages), "completed_pages_count": len(pages)}
+        if total_pages:
+            view["progress_percentage"] = round(len(pages) / total_pages * 100, 2)
+        return view
+
+    def _ops(self, batch: Dict[Key, dict]) -> Tuple[list, list]:
+        """Bulk operations plus, per operation, (key, "activity" | "pages", filter)"""
+        ops, targets = [], []
+        now = datetime.utcnow()
+        for key, entry in batch.items():
+            user_id, material_id = key
+            query = {"user_id": user_id, "material_id": material_id}
+            if entry["seconds"] or entry["current_page"]:
+                # Heartbeats are kept apart from page marks so a page-op miss can be
+                # replayed without counting reading time twice
+                activity = {"$set": {"last_read_at": now, "last_updated": now}}
+                if entry["current_page"]:
+                    activity["$set"]["last_page"] = entry["current_page"]
+                if entry["seconds"]:
+                    activity["$inc"] = {"reading_seconds": entry["seconds"]}
+                ops.append(UpdateOne(query, activity))
+                targets.append((key, "activity", query))
+            if entry["pages"]:
+                extra, update = page_marks_update(entry["pages"])
+                page_query = {**query, **extra}
+                ops.append(UpdateOne(page_query, update))
+                targets.append((key, "pages", page_query))
+        return ops, targets
+
+    def _requeue(self, batch: Dict[Key, dict], targets: list, indexes: Iterable[int]) -> None:
+        """Put just the failed writes back; a key failing MAX_ATTEMPTS flushes is dropped"""
+        for index in indexes:
+            key, kind, _ = targets[index]
+            entry = batch[key]
+            if entry["attempts"] + 1 >= self.MAX_ATTEMPTS:
+                self.dropped += 1
+                logger.warning("Dropping buffered %s for %s/%s after %d failed flushes", kind, *key, self.MAX_ATTEMPTS)
+                continue
+            pending = self._entry(key)
+            pending["attempts"] = max(pending["attempts"], entry["attempts"] + 1)
+            if kind == "pages":
+                self._merge(pending, entry["pages"], 0.0, None)
+            else:
+                self._merge(pending, (), entry["seconds"], entry["current_page"])
+
+    async def _unmatched_page_keys(self, batch: Dict[Key, dict], targets: list, skip: Set[int]) -> Dict[Key, Set[int]]:
+        """Keys whose page-mark filter matched nothing (bitmap not sized yet, or no record)"""
+        filters = {
+            key: query for index, (key, kind, query) in enumerate(targets)
+            if kind == "pages" and index not in skip
+        }
+        if not filters:
+            return {}
+        matched = set()
+        cursor = self.progress_collection.find({"$or": list(filters.values())}, {"user_id": 1, "material_id": 1})
+        async for doc in cursor:
+            matched.add((doc["user_id"], doc["material_id"]))
+        return {key: batch[key]["pages"] for key in filters if key not in matched}
+
+    async def _write(self, batch: Dict[Key, dict]) -> Dict[Key, Set[int]]:
+        """One unordered bulk_write; returns the page marks that need the slow path"""
+        ops, targets = self._ops(batch)
+        failed: Set[int] = set()
+        try:
+            result = await self.progress_collection.bulk_write(ops, ordered=False)
+            matched = result.matched_count
+        except BulkWriteError as e:
+            # Writes not listed in writeErrors were applied: only the failed ones are retried,
+            # so reading time that already reached MongoDB is never counted again
+            failed = {err["index"] for err in e.details.get("writeErrors", [])}
+            matched = e.details.get("nMatched", 0)
+            logger.warning("Progress flush: %d of %d writes failed, retrying those", len(failed), len(ops))
+            self.failures += 1
+            self._requeue(batch, targets, failed)
+        except PyMongoError as e:
+            logger.warning("Progress flush failed, will retry: %s", e)
+            self.failures += 1
+            self._requeue(batch, targets, range(len(ops)))
+            return {}
+        self.flushes += 1
+        self.ops_written += len(ops) - len(failed)
+        if matched < len(ops) - len(failed):
+            return await self._unmatched_page_keys(batch, targets, failed)
+        return {}
+
+    async def _replay(self, replay: Dict[Key, Set[int]]) -> None:
+        """Slow path for page marks whose filter did not match; page marks are idempotent"""
+        self.fallbacks += 1
+        try:
+            for (user_id, material_id), pages in replay.items():
+                try:
+                    await progress_service.apply_page_marks(user_id, material_id, pages)
+                except Exception as e:
+                    logger.warning("Dropping page marks for %s/%s: %s", user_id, material_id, e)
+                self._replaying.pop((user_id, material_id), None)
+        finally:
+            for key in replay:
+                self._replaying.pop(key, None)
+
+    async def flush(self) -> int:
+        """Write everything pending; returns the number of (user, material) keys flushed"""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            self._inflight = batch
+            try:
+                replay = await self._write(batch)
+                self._replaying.update(replay)
+            finally:
+                self._inflight = {}
+        # Outside the lock: producers and the next flush are not held up by the slow path
+        if replay:
+            await self._replay(replay)
+        return len(batch)
+
+    async def shutdown(self) -> None:
+        """Flush on graceful shutdown"""
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending_keys": len(self._pending),
+            "events": self.events,
+            "flushes": self.flushes,
+            "ops_written": self.ops_written,
+            "fallbacks": self.fallbacks,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "pages_dropped": self.pages_dropped,
+            "flush_interval_seconds": settings.PROGRESS_FLUSH_INTERVAL_SECONDS
+        }
+
+# Singleton instance
+progress_buffer = ProgressWriteBuffer()
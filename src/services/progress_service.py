@@ -2,89 +2,399 @@
 Progress tracking service
 """
 from fastapi import HTTPException
+from bson.int64 import Int64
+from pymongo import ReturnDocument
+from typing import Iterable, List, Optional, Tuple
 from src.core.database import get_progress_collection, get_materials_collection
 from src.core.models import ProgressUpdate, User
 from datetime import datetime
 
+# Completed pages are stored as a bitmap: an array of 64-bit integers holding
+# PAGES_PER_WORD pages each (page p -> word (p-1)//32, bit (p-1)%32). Only the low
+# 32 bits are used so word arithmetic in update pipelines never touches the sign bit.
+PAGES_PER_WORD = 32
+# Upper bound for page numbers accepted before a material's total_pages is known
+# (buffered marks); keeps page_marks_update literals small
+MAX_PAGE_NUMBER = 100_000
+
+def page_word_and_mask(page: int) -> tuple:
+    return (page - 1) // PAGES_PER_WORD, 1 << ((page - 1) % PAGES_PER_WORD)
+
+def word_count(total_pages: int) -> int:
+    return -(-total_pages // PAGES_PER_WORD)
+
+def pages_to_words(pages: Iterable[int], total_pages: int = 0) -> List[Int64]:
+    pages = [p for p in pages if p >= 1]
+    words = [0] * word_count(max([total_pages, *pages]))
+    for page in pages:
+        index, mask = page_word_and_mask(page)
+        words[index] |= mask
+    return [Int64(w) for w in words]
+
+def words_to_pages(words: Iterable[int]) -> List[int]:
+    pages = []
+    for index, word in enumerate(words):
+        bit = 0
+        while word:
+            if word & 1:
+                pages.append(index * PAGES_PER_WORD + bit + 1)
+            word >>= 1
+            bit += 1
+    return pages
+
+def completed_pages_of(progress: dict) -> List[int]:
+    """Completed pages as a sorted list (from the bitmap, or the legacy list field)"""
+    if "completed_pages_bits" in progress:
+        return words_to_pages(progress["completed_pages_bits"])
+    return sorted(set(progress.get("completed_pages") or []))
+
+def _percentage(count: int, total_pages: Optional[int]) -> float:
+    return round(count / total_pages * 100, 2) if total_pages else 0.0
+
+def _replace_word(index: int, expr) -> dict:
+    """Pipeline expression: completed_pages_bits with word ``index`` replaced by ``expr``"""
+    words = [[expr]]
+    if index > 0:
+        words.insert(0, {"$slice": ["$completed_pages_bits", index]})
+    words.append({"$slice": ["$completed_pages_bits", index + 1, {"$size": "$completed_pages_bits"}]})
+    return {"$concatArrays": words}
+
+_PERCENTAGE_STAGE = {"$set": {
+    "progress_percentage": {"$round": [
+        {"$multiply": [{"$divide": ["$completed_pages_count", "$total_pages"]}, 100]}, 2
+    ]}
+}}
+
+def page_marks_update(pages: Iterable[int]) -> Tuple[dict, list]:
+    """(extra filter, update pipeline) marking many pages in one write.
+
+    Masks are grouped per word in Python and applied by a fixed number of
+    stages however many pages are marked: the first computes, per word, the
+    value and number of bits still clear, the second adds them. Replaying the
+    same marks is therefore harmless. Without $bitOr (MongoDB < 6.3) the test is
+    floor(word / mask) mod 2, exact for 32-bit words.
+    """
+    pages = sorted({p for p in pages if p >= 1})
+    last_index = page_word_and_mask(pages[-1])[0]
+    masks_by_word = [[] for _ in range(last_index + 1)]
+    for page in pages:
+        index, mask = page_word_and_mask(page)
+        masks_by_word[index].append(mask)
+    words = len(masks_by_word)
+
+    clear = {"$eq": [{"$mod": [{"$floor": {"$divide": ["$$word", "$$this"]}}, 2]}, 0]}
+    # [value to add, pages newly completed] for each of the first `words` words
+    additions = {"$map": {"input": {"$range": [0, words]}, "as": "i", "in": {"$let": {
+        "vars": {"word": {"$arrayElemAt": ["$completed_pages_bits", "$$i"]}},
+        "in": {"$reduce": {
+            "input": {"$arrayElemAt": [{"$literal": masks_by_word}, "$$i"]},
+            "initialValue": [0, 0],
+            "in": {"$cond": [
+                clear,
+                [
+                    {"$add": [{"$arrayElemAt": ["$$value", 0]}, "$$this"]},
+                    {"$add": [{"$arrayElemAt": ["$$value", 1]}, 1]}
+                ],
+                "$$value"
+            ]}
+        }}
+    }}}}
+    updated_words = {"$map": {"input": {"$range": [0, words]}, "as": "i", "in": {"$add": [
+        {"$arrayElemAt": ["$completed_pages_bits", "$$i"]},
+        {"$arrayElemAt": [{"$arrayElemAt": ["$_page_marks", "$$i"]}, 0]}
+    ]}}}
+    stages = [
+        {"$set": {"_page_marks": additions}},
+        {"$set": {
+            "completed_pages_bits": {"$concatArrays": [updated_words, {"$slice": [
+                "$completed_pages_bits", words,
+                {"$max": [{"$subtract": [{"$size": "$completed_pages_bits"}, words]}, 1]}
+            ]}]},
+            "completed_pages_count": {"$add": [
+                {"$ifNull": ["$completed_pages_count", 0]},
+                {"$sum": {"$map": {"input": "$_page_marks", "in": {"$arrayElemAt": ["$$this", 1]}}}}
+            ]},
+            "last_updated": "$$NOW"
+        }},
+        {"$unset": "_page_marks"},
+        _PERCENTAGE_STAGE
+    ]
+    # Only documents whose bitmap is already sized for these pages (see _prepare_page_bits)
+    return {"total_pages": {"$gte": pages[-1]}, f"completed_pages_bits.{last_index}": {"$exists": True}}, stages
+
 class ProgressService:
     """Service for tracking user progress"""
-    
+
     def __init__(self):
         self.progress_collection = get_progress_collection()
         self.materials_collection = get_materials_collection()
-    
-    def get_progress(self, material_id: str, user: User) -> dict:
+
+    async def get_progress(self, material_id: str, user: User) -> dict:
         """Get user's progress for a material"""
-        progress = self.progress_collection.find_one({
-            "user_id": user.id, 
+        progress = await self.progress_collection.find_one({
+            "user_id": user.id,
             "material_id": material_id
         })
         if not progress:
             raise HTTPException(status_code=404, detail="Progress not found")
-        return progress
-    
-    def update_progress(self, material_id: str, progress_update: ProgressUpdate, user: User) -> dict:
+        return self._with_page_list(progress)
+
+    async def list_progress(
+        self,
+        user: User,
+        skip: int = 0,
+        limit: Optional[int] = None,
+        include_pages: bool = False,
+        pages_for: Iterable[str] = ()
+    ) -> dict:
+        """Every progress record of the user joined with lightweight material metadata.
+
+        One aggregation: $match/$sort on user_id/material_id ride the
+        user_material_unique index, and the $lookup projects only the material
+        fields the dashboard shows (never content). completed_pages is returned
+        for every item with ``include_pages``, otherwise only for the materials in
+        ``pages_for`` (those with buffered page marks to overlay).
+        """
+        pages_for = sorted(pages_for)
+        page_fields = {}
+        if include_pages:
+            page_fields = {"completed_pages_bits": 1, "completed_pages": 1}
+        elif pages_for:
+            page_fields = {
+                field: {"$cond": [{"$in": ["$material_id", pages_for]}, f"${field}", "$$REMOVE"]}
+                for field in ("completed_pages_bits", "completed_pages")
+            }
+        page_stages = [{"$skip": skip}]
+        if limit:
+            page_stages.append({"$limit": limit})
+        page_stages += [
+            {"$lookup": {
+                "from": "materials",
+                "let": {"material_id": "$material_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$_id", "$$material_id"]}}},
+                    {"$project": {
+                        "_id": 0, "id": "$_id", "title": 1, "description": 1, "department": 1,
+                        "content_type": 1, "total_pages": 1, "thumbnail_path": 1, "processing_status": 1
+                    }}
+                ],
+                "as": "material"
+            }},
+            {"$project": {
+                "_id": 0,
+                "material_id": 1,
+                "progress_percentage": 1,
+                "completed_pages_count": {"$ifNull": [
+                    "$completed_pages_count", {"$size": {"$ifNull": ["$completed_pages", []]}}
+                ]},
+                "total_pages": 1,
+                "reading_seconds": 1,
+                "last_page": 1,
+                "started_at": 1,
+                "last_updated": 1,
+                "material": {"$arrayElemAt": ["$material", 0]},
+                **page_fields
+            }}
+        ]
+        pipeline = [
+            {"$match": {"user_id": user.id}},
+            {"$sort": {"material_id": 1}},
+            {"$facet": {"items": page_stages, "total": [{"$count": "count"}]}}
+        ]
+        result = await self.progress_collection.aggregate(pipeline).to_list(length=1)
+        facet = result[0] if result else {"items": [], "total": []}
+        items = facet["items"]
+        if include_pages or pages_for:
+            items = [
+                self._with_page_list(item) if include_pages or item["material_id"] in pages_for else item
+                for item in items
+            ]
+        return {
+            "items": items,
+            "total": facet["total"][0]["count"] if facet["total"] else 0,
+            "skip": skip,
+            "limit": limit
+        }
+
+    async def update_progress(self, material_id: str, progress_update: ProgressUpdate, user: User) -> dict:
         """Update user's progress for a material"""
-        update_fields = {
-            "progress_percentage": progress_update.progress_percentage,
-            "completed_sections": progress_update.completed_sections,
-            "last_updated": datetime.utcnow()
+        update = {
+            "$set": {
+                "progress_percentage": progress_update.progress_percentage,
+                "completed_sections": progress_update.completed_sections,
+                "last_updated": datetime.utcnow()
+            }
         }
         if progress_update.completed_pages is not None:
-            update_fields["completed_pages"] = progress_update.completed_pages
-        result = self.progress_collection.update_one(
+            pages = sorted(set(progress_update.completed_pages))
+            material = await self.materials_collection.find_one(
+                {"_id": material_id}, {"total_pages": 1, "processing_status": 1}
+            )
+            if not material:
+                raise HTTPException(status_code=404, detail="Material not found")
+            total_pages = material.get("total_pages") or 0
+            # The bitmap is sized from total_pages, never from client-supplied page numbers.
+            # While the material is still being processed its page count is not known yet:
+            # pages are accepted up to MAX_PAGE_NUMBER and trimmed once _prepare_page_bits
+            # sizes the bitmap against the real total_pages.
+            limit = total_pages
+            if not total_pages and material.get("processing_status") in ("queued", "processing"):
+                limit = MAX_PAGE_NUMBER
+            if pages and not limit:
+                raise HTTPException(status_code=400, detail="Material has no page count")
+            if pages and (pages[0] < 1 or pages[-1] > limit):
+                raise HTTPException(status_code=400, detail=f"Pages must be between 1 and {limit}")
+            if total_pages:
+                update["$set"]["total_pages"] = total_pages
+            update["$set"]["completed_pages_bits"] = pages_to_words(pages, total_pages)
+            update["$set"]["completed_pages_count"] = len(pages)
+            update["$unset"] = {"completed_pages": ""}
+        result = await self.progress_collection.update_one(
             {"user_id": user.id, "material_id": material_id},
-            {"$set": update_fields}
+            update
         )
-        
+
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Progress record not found")
-        
+
         return {"message": "Progress updated successfully"}
 
-    def mark_page_complete(self, material_id: str, page_number: int, user: User) -> dict:
-        material = self.materials_collection.find_one({"_id": material_id})
-        if not material:
-            raise HTTPException(status_code=404, detail="Material not found")
-        total_pages = material.get("total_pages")
-        if not total_pages or page_number < 1 or page_number > total_pages:
+    async def mark_page_complete(self, material_id: str, page_number: int, user: User) -> dict:
+        """Set one page's bit and recompute the percentage in a single atomic update.
+
+        The record is read only when the fast path cannot apply: the page is
+        already complete, or the bitmap still has to be sized (or converted from
+        the legacy list) against the material's total_pages.
+        """
+        if page_number < 1:
             raise HTTPException(status_code=400, detail="Invalid page number")
-        progress = self.progress_collection.find_one({"user_id": user.id, "material_id": material_id})
-        if not progress:
-            raise HTTPException(status_code=404, detail="Progress record not found")
-        completed_pages = progress.get("completed_pages", [])
-        if page_number not in completed_pages:
-            completed_pages.append(page_number)
-            completed_pages.sort()
-        percentage = round((len(completed_pages) / total_pages) * 100, 2)
-        self.progress_collection.update_one(
-            {"_id": progress["_id"]},
-            {"$set": {"completed_pages": completed_pages, "progress_percentage": percentage, "last_updated": datetime.utcnow()}}
-        )
-        return {"progress_percentage": percentage, "completed_pages": completed_pages, "total_pages": total_pages}
+        for _ in range(3):
+            progress = await self._set_page_bit(user.id, material_id, page_number)
+            if progress:
+                return self._page_view(progress)
+            progress = await self.progress_collection.find_one({"user_id": user.id, "material_id": material_id})
+            if not progress:
+                raise HTTPException(status_code=404, detail="Progress record not found")
+            total_pages = progress.get("total_pages")
+            if total_pages and page_number <= total_pages and page_number in completed_pages_of(progress):
+                return self._page_view(progress)
+            await self._prepare_page_bits(progress, page_number)
+        raise HTTPException(status_code=409, detail="Progress is being updated concurrently, please retry")
 
-    def complete_material(self, material_id: str, user: User) -> dict:
-        material = self.materials_collection.find_one({"_id": material_id})
+    async def complete_material(self, material_id: str, user: User) -> dict:
+        material = await self.materials_collection.find_one({"_id": material_id}, {"total_pages": 1})
         if not material:
             raise HTTPException(status_code=404, detail="Material not found")
         total_pages = material.get("total_pages")
-        progress = self.progress_collection.find_one({"user_id": user.id, "material_id": material_id})
-        if not progress:
-            raise HTTPException(status_code=404, detail="Progress record not found")
+        update = {"$set": {"progress_percentage": 100.0, "last_updated": datetime.utcnow()}}
         if total_pages and total_pages > 0:
-            completed_pages = list(range(1, total_pages + 1))
-            percentage = 100.0
-            self.progress_collection.update_one(
-                {"_id": progress["_id"]},
-                {"$set": {"completed_pages": completed_pages, "progress_percentage": percentage, "last_updated": datetime.utcnow()}}
-            )
-            return {"progress_percentage": percentage, "completed_pages": completed_pages, "total_pages": total_pages}
+            update["$set"].update({
+                "total_pages": total_pages,
+                "completed_pages_bits": pages_to_words(range(1, total_pages + 1)),
+                "completed_pages_count": total_pages
+            })
+            update["$unset"] = {"completed_pages": ""}
+        result = await self.progress_collection.update_one(
+            {"user_id": user.id, "material_id": material_id},
+            update
+        )
+        if result.matched_count == 0:
+            raise HTTPException(status_code=404, detail="Progress record not found")
+        completed_pages = list(range(1, total_pages + 1)) if total_pages else []
+        return {"progress_percentage": 100.0, "completed_pages": completed_pages, "total_pages": total_pages}
+
+    async def apply_page_marks(self, user_id: str, material_id: str, pages: Iterable[int]) -> bool:
+        """Mark many pages in one update, sizing or converting the bitmap first when needed.
+        Pages beyond the material's total_pages are dropped. False if there is no progress record."""
+        query = {"user_id": user_id, "material_id": material_id}
+        pages = sorted({p for p in pages if 1 <= p <= MAX_PAGE_NUMBER})
+        for _ in range(3):
+            if not pages:
+                return await self.progress_collection.count_documents(query, limit=1) > 0
+            extra, update = page_marks_update(pages)
+            result = await self.progress_collection.update_one({**query, **extra}, update)
+            if result.matched_count:
+                return True
+            progress = await self.progress_collection.find_one(query)
+            if not progress:
+                return False
+            material = await self.materials_collection.find_one({"_id": material_id}, {"total_pages": 1})
+            total_pages = (material or {}).get("total_pages") or 0
+            pages = [p for p in pages if p <= total_pages]
+            if pages:
+                await self._prepare_page_bits(progress, pages[-1])
+        return False
+
+    # Internal helpers
+    async def _set_page_bit(self, user_id: str, material_id: str, page_number: int) -> Optional[dict]:
+        """Fast path: one find_one_and_update that matches only while the page's bit is clear"""
+        index, mask = page_word_and_mask(page_number)
+        return await self.progress_collection.find_one_and_update(
+            {
+                "user_id": user_id,
+                "material_id": material_id,
+                "total_pages": {"$gte": page_number},
+                f"completed_pages_bits.{index}": {"$bitsAllClear": mask}
+            },
+            [
+                {"$set": {
+                    # The bit is known to be clear, so OR-ing it in is an addition
+                    "completed_pages_bits": _replace_word(
+                        index, {"$add": [{"$arrayElemAt": ["$completed_pages_bits", index]}, Int64(mask)]}
+                    ),
+                    "completed_pages_count": {"$add": [{"$ifNull": ["$completed_pages_count", 0]}, 1]},
+                    "last_updated": "$$NOW"
+                }},
+                _PERCENTAGE_STAGE
+            ],
+            projection={"completed_pages_bits": 1, "total_pages": 1, "progress_percentage": 1},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _prepare_page_bits(self, progress: dict, page_number: int) -> None:
+        """Slow path: record total_pages on the progress document and size (or convert) its
+        bitmap. Guarded on the bitmap's current value so a concurrent writer is never lost."""
+        total_pages = progress.get("total_pages")
+        if not total_pages or page_number > total_pages:
+            material = await self.materials_collection.find_one({"_id": progress["material_id"]}, {"total_pages": 1})
+            if not material:
+                raise HTTPException(status_code=404, detail="Material not found")
+            total_pages = material.get("total_pages")
+        if not total_pages or page_number > total_pages:
+            raise HTTPException(status_code=400, detail="Invalid page number")
+        pages = [p for p in completed_pages_of(progress) if p <= total_pages]
+        guard = {"_id": progress["_id"]}
+        if "completed_pages_bits" in progress:
+            guard["completed_pages_bits"] = progress["completed_pages_bits"]
         else:
-            self.progress_collection.update_one(
-                {"_id": progress["_id"]},
-                {"$set": {"progress_percentage": 100.0, "last_updated": datetime.utcnow()}}
-            )
-            return {"progress_percentage": 100.0, "completed_pages": [], "total_pages": total_pages}
+            guard["completed_pages_bits"] = {"$exists": False}
+        await self.progress_collection.update_one(
+            guard,
+            {
+                "$set": {
+                    "total_pages": total_pages,
+                    "completed_pages_bits": pages_to_words(pages, total_pages),
+                    "completed_pages_count": len(pages),
+                    "progress_percentage": _percentage(len(pages), total_pages)
+                },
+                "$unset": {"completed_pages": ""}
+            }
+        )
+
+    @staticmethod
+    def _with_page_list(progress: dict) -> dict:
+        """API form of a progress document: the bitmap is expanded to completed_pages"""
+        view = {k: v for k, v in progress.items() if k != "completed_pages_bits"}
+        view["completed_pages"] = completed_pages_of(progress)
+        return view
+
+    @staticmethod
+    def _page_view(progress: dict) -> dict:
+        return {
+            "progress_percentage": progress.get("progress_percentage", 0.0),
+            "completed_pages": completed_pages_of(progress),
+            "total_pages": progress.get("total_pages")
+        }
 
 # Singleton instance
 progress_service = ProgressService()
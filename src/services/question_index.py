@@ -0,0 +1,93 @@
+"""
+In-process index of question ids for constant-time daily question selection
+"""
+import random
+from typing import Dict, List, Optional, Tuple
+from src.core.database import get_questions_collection, get_counters_collection
+
+class QuestionIndex:
+    """Maps department and (department, material_id) to arrays of question ids.
+    
+    Only ids are held in memory; the chosen question is fetched by id. The
+    snapshot is rebuilt from a projected scan when the ``questions`` version
+    counter (bumped by writers via bump_version) or the collection size changes,
+    so polling is a single small read while the bank is unchanged.
+    """
+    
+    def __init__(self):
+        self.questions_collection = get_questions_collection()
+        self.counters_collection = get_counters_collection()
+        self._by_department: Dict[str, List[str]] = {}
+        self._by_material: Dict[Tuple[str, Optional[str]], List[str]] = {}
+        self.version: Optional[tuple] = None
+        self.rebuilds = 0
+    
+    @property
+    def loaded(self) -> bool:
+        return self.version is not None
+    
+    async def _current_version(self) -> tuple:
+        counter = await self.counters_collection.find_one({"_id": "questions"})
+        count = await self.questions_collection.estimated_document_count()
+        return (counter.get("version", 0) if counter else 0, count)
+    
+    async def refresh(self, force: bool = False) -> bool:
+        """Rebuild the snapshot if the question bank changed; returns True if rebuilt"""
+        version = await self._current_version()
+        if not force and version == self.version:
+            return False
+        
+        by_department: Dict[str, List[str]] = {}
+        by_material: Dict[Tuple[str, Optional[str]], List[str]] = {}
+        cursor = self.questions_collection.find(
+            {}, {"_id": 0, "question_id": 1, "department": 1, "material_id": 1}
+        )
+        async for q in cursor:
+            department = q.get("department")
+            by_department.setdefault(department, []).append(q["question_id"])
+            by_material.setdefault((department, q.get("material_id")), []).append(q["question_id"])
+        
+        # Swap in one step so concurrent picks never see a half-built snapshot
+        self._by_department, self._by_material = by_department, by_material
+        self.version = version
+        self.rebuilds += 1
+        return True
+    
+    async def bump_version(self) -> None:
+        """Signal that questions were created, changed or removed"""
+        await self.counters_collection.update_one(
+            {"_id": "questions"}, {"$inc": {"version": 1}}, upsert=True
+        )
+    
+    def pick(self, department: str, enrolled_materials: List[str]) -> Optional[str]:
+        """Pick a random question id matching the daily-question rules.
+        
+        Without enrollments every question of the department qualifies;
+        otherwise questions of enrolled materials plus material-less ones.
+        """
+        if not enrolled_materials:
+            pools = [self._by_department.get(department, [])]
+        else:
+            pools = [self._by_material.get((department, m), []) for m in set(enrolled_materials)]
+            pools.append(self._by_material.get((department, None), []))
+        
+        total = sum(len(pool) for pool in pools)
+        if total == 0:
+            return None
+        offset = random.randrange(total)
+        for pool in pools:
+            if offset < len(pool):
+                return pool[offset]
+            offset -= len(pool)
+        return None
+    
+    def stats(self) -> dict:
+        return {
+            "version": list(self.version) if self.version else None,
+            "departments": len(self._by_department),
+            "questions": sum(len(ids) for ids in self._by_department.values()),
+            "rebuilds": self.rebuilds
+        }
+
+# Singleton instance
+question_index = QuestionIndex()
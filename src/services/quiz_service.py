@@ -1,13 +1,22 @@
 """
 Quiz service for managing questions and answers
 """
-from fastapi import HTTPException
-from sentence_transformers import SentenceTransformer, util
-import random
-from typing import List
+from fastapi import HTTPException, BackgroundTasks
+from sentence_transformers import SentenceTransformer
+from bson import Binary
+import asyncio
+import numpy as np
+import uuid
+from typing import List, Optional, Tuple
 from src.core.database import get_questions_collection, get_progress_collection
-from src.core.models import QuestionResponse, AnswerRequest, User
+from src.core.cache import TTLCache
+from src.core.models import QuestionResponse, QuestionCreate, AnswerRequest, User
 from src.services.ai_service import ai_service
+from src.services.explanation_tickets import explanation_ticket_service
+from src.services.explanation_pregenerator import stored_option_explanation
+from src.services.question_index import question_index
+from src.services.embedding_batcher import EmbeddingBatcher
+from src.services.answer_grader import AnswerGrader, split_acceptable_answers
 from src.core.config import settings
 from datetime import datetime
 
@@ -17,23 +26,39 @@ class QuizService:
     def __init__(self):
         self.questions_collection = get_questions_collection()
         self.progress_collection = get_progress_collection()
-        self.embedder = SentenceTransformer('all-mpnet-base-v2')
+        self.embedding_model = settings.EMBEDDING_MODEL
+        self.embedder = SentenceTransformer(self.embedding_model)
+        self.embedding_batcher = EmbeddingBatcher(
+            self._encode_batch,
+            max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS
+        )
         self.similarity_threshold = settings.SIMILARITY_THRESHOLD
+        self.answer_grader = AnswerGrader(
+            max_edit_distance=settings.LEXICAL_MAX_EDIT_DISTANCE,
+            min_length_for_edits=settings.LEXICAL_MIN_LENGTH_FOR_EDITS
+        )
+        # Decoded answer-embedding matrices keyed by (question_id, answer)
+        self.answer_matrix_cache = TTLCache(
+            max_size=settings.ANSWER_MATRIX_CACHE_SIZE,
+            ttl_seconds=settings.ANSWER_MATRIX_CACHE_TTL_SECONDS
+        )
     
-    def get_daily_question(self, user: User) -> QuestionResponse:
+    async def get_daily_question(self, user: User) -> QuestionResponse:
         """Get a daily question for the user"""
-        query = {"department": user.department}
-        if user.enrolled_materials:
-            query["$or"] = [
-                {"material_id": {"$in": user.enrolled_materials}},
-                {"material_id": {"$exists": False}}
-            ]
+        if not question_index.loaded:
+            await question_index.refresh()
         
-        questions = list(self.questions_collection.find(query))
-        if not questions:
+        question_id = question_index.pick(user.department, user.enrolled_materials)
+        q = await self._find_question(question_id)
+        if question_id is not None and q is None:
+            # Picked question was removed since the last poll; rebuild and retry once
+            await question_index.refresh(force=True)
+            q = await self._find_question(question_index.pick(user.department, user.enrolled_materials))
+        
+        if not q:
             raise HTTPException(status_code=404, detail="No questions available for your department")
         
-        q = random.choice(questions)
         return QuestionResponse(
             question_id=q["question_id"],
             question_text=q["question_text"],
@@ -43,36 +68,64 @@ class QuizService:
             material_id=q.get("material_id")
         )
     
-    def check_answer(self, answer_request: AnswerRequest, user: User) -> dict:
-        """Check user's answer and provide explanation"""
-        q = self.questions_collection.find_one({"question_id": answer_request.question_id})
+    async def _find_question(self, question_id: Optional[str]) -> Optional[dict]:
+        if question_id is None:
+            return None
+        return await self.questions_collection.find_one({"question_id": question_id})
+    
+    async def check_answer(
+        self,
+        answer_request: AnswerRequest,
+        user: User,
+        background_tasks: Optional[BackgroundTasks] = None
+    ) -> dict:
+        """Check user's answer and provide explanation (inline or via a ticket)"""
+        q, correct = await self.grade_answer(answer_request, user)
+        
+        # A stored MCQ explanation is already at hand: returned inline, no ticket round-trip
+        stored = stored_option_explanation(q, answer_request.user_answer)
+        if answer_request.explanation_mode == "deferred" and background_tasks is not None and stored is None:
+            ticket_id = await explanation_ticket_service.create(user.id, q["question_id"])
+            background_tasks.add_task(self._deliver_explanation, ticket_id, q, answer_request.user_answer)
+            return {
+                "correct": correct,
+                "correct_answer": q["answer"],
+                "explanation": None,
+                "explanation_ticket": ticket_id,
+                "explanation_status": "pending"
+            }
+        
+        return {
+            "correct": correct,
+            "correct_answer": q["answer"],
+            "explanation": stored if stored is not None else await self.explain(q, answer_request.user_answer)
+        }
+    
+    async def explain(self, q: dict, user_answer: str) -> str:
+        """Pre-generated MCQ option explanation when current, otherwise the (cached) LLM"""
+        stored = stored_option_explanation(q, user_answer)
+        if stored is not None:
+            return stored
+        explanation_result = await ai_service.explain_answer(
+            q["public_text"], user_answer, q["answer"], question_id=q["question_id"], options=q.get("options")
+        )
+        return explanation_result.get("explanation", "No explanation available.")
+    
+    async def grade_answer(self, answer_request: AnswerRequest, user: User) -> Tuple[dict, bool]:
+        """Grade an answer and record it against material progress; returns (question, correct)"""
+        q = await self.questions_collection.find_one({"question_id": answer_request.question_id})
         if not q:
             raise HTTPException(status_code=404, detail="Question not found")
         
         # Check correctness
-        correct = False
-        if q["question_type"].lower().startswith("fill"):
-            correct_answers = [a.strip() for a in q["answer"].replace(' or ', ',').split(',')]
-            user_emb = self.embedder.encode(answer_request.user_answer, convert_to_tensor=True)
-            for ans in correct_answers:
-                ans_emb = self.embedder.encode(ans, convert_to_tensor=True)
-                sim = float(util.pytorch_cos_sim(user_emb, ans_emb))
-                if sim >= self.similarity_threshold:
-                    correct = True
-                    break
+        if self._is_fill_in(q):
+            correct = await self._grade_fill_in(q, answer_request.user_answer)
         else:
             correct = answer_request.user_answer.strip().lower() == q["answer"].strip().lower()
         
-        # Get AI explanation
-        explanation_result = ai_service.explain_answer(
-            q["public_text"], 
-            answer_request.user_answer, 
-            q["answer"]
-        )
-        
         # Update progress if from material
         if q.get("material_id"):
-            self.progress_collection.update_one(
+            await self.progress_collection.update_one(
                 {"user_id": user.id, "material_id": q["material_id"]},
                 {
                     "$inc": {"questions_answered": 1, "correct_answers": 1 if correct else 0},
@@ -80,12 +133,113 @@ class QuizService:
                 },
                 upsert=True
             )
+        return q, correct
+    
+    async def _deliver_explanation(self, ticket_id: str, q: dict, user_answer: str) -> None:
+        """Background task: generate the explanation and resolve its ticket"""
+        try:
+            await explanation_ticket_service.resolve(ticket_id, await self.explain(q, user_answer))
+        except Exception as e:
+            await explanation_ticket_service.resolve(
+                ticket_id, f"Error generating explanation: {str(e)}", status="failed"
+            )
+    
+    async def create_questions(self, questions: List[QuestionCreate]) -> List[str]:
+        """Insert questions, precomputing answer embeddings for fill-in questions"""
+        docs = []
+        for question in questions:
+            doc = question.dict()
+            doc["question_id"] = doc.get("question_id") or str(uuid.uuid4())
+            doc["public_text"] = doc.get("public_text") or doc["question_text"]
+            if doc.get("material_id") is None:
+                doc.pop("material_id", None)
+            if self._is_fill_in(doc):
+                doc["answer_embeddings"] = await self._encode_answers(doc["answer"])
+            docs.append(doc)
         
+        if docs:
+            await self.questions_collection.insert_many(docs)
+            await question_index.bump_version()
+        return [doc["question_id"] for doc in docs]
+    
+    async def backfill_answer_embeddings(self) -> int:
+        """Compute answer embeddings for fill-in questions missing them for the current model"""
+        updated = 0
+        cursor = self.questions_collection.find(
+            {"question_type": {"$regex": "^fill", "$options": "i"}},
+            {"question_id": 1, "answer": 1, "answer_embeddings.model": 1, "answer_embeddings.answer": 1}
+        )
+        async for q in cursor:
+            if self._has_current_embeddings(q):
+                continue
+            await self.questions_collection.update_one(
+                {"_id": q["_id"]},
+                {"$set": {"answer_embeddings": await self._encode_answers(q["answer"])}}
+            )
+            updated += 1
+        return updated
+    
+    # Internal helpers
+    @staticmethod
+    def _is_fill_in(q: dict) -> bool:
+        return q["question_type"].lower().startswith("fill")
+    
+    @staticmethod
+    def _acceptable_answers(answer: str) -> List[str]:
+        """Split an answer key like 'A or B, C' into its acceptable answers"""
+        return split_acceptable_answers(answer)
+    
+    def _has_current_embeddings(self, q: dict) -> bool:
+        stored = q.get("answer_embeddings") or {}
+        return stored.get("model") == self.embedding_model and stored.get("answer") == q["answer"]
+    
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Runs on the batcher's worker thread"""
+        return self.embedder.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    
+    async def _encode_answers(self, answer: str) -> dict:
+        """Embed every acceptable answer once; stored as unit-normalized float16 rows"""
+        answers = self._acceptable_answers(answer)
+        vectors = await asyncio.gather(*(self.embedding_batcher.encode(a) for a in answers))
+        matrix = np.asarray(np.stack(vectors), dtype=np.float16)
         return {
-            "correct": correct,
-            "correct_answer": q["answer"],
-            "explanation": explanation_result.get("explanation", "No explanation available.")
+            "model": self.embedding_model,
+            "answer": answer,
+            "count": int(matrix.shape[0]),
+            "dim": int(matrix.shape[1]),
+            "dtype": "float16",
+            "data": Binary(matrix.tobytes())
         }
+    
+    async def _answer_matrix(self, q: dict) -> np.ndarray:
+        """float32 (answers x dim) matrix for a question, backfilling stale/missing embeddings"""
+        cache_key = (q["question_id"], q["answer"])
+        matrix = self.answer_matrix_cache.get(cache_key)
+        if matrix is not None:
+            return matrix
+        
+        if self._has_current_embeddings(q):
+            stored = q["answer_embeddings"]
+        else:
+            stored = await self._encode_answers(q["answer"])
+            await self.questions_collection.update_one(
+                {"_id": q["_id"]}, {"$set": {"answer_embeddings": stored}}
+            )
+        matrix = np.frombuffer(stored["data"], dtype=np.float16)
+        matrix = matrix.reshape(stored["count"], stored["dim"]).astype(np.float32)
+        self.answer_matrix_cache.set(cache_key, matrix)
+        return matrix
+    
+    async def _grade_fill_in(self, q: dict, user_answer: str, use_lexical: bool = True) -> bool:
+        """Lexical tiers first; otherwise cosine similarity (one encode, one matrix-vector product)"""
+        if use_lexical:
+            if self.answer_grader.match(user_answer, self._acceptable_answers(q["answer"])):
+                return True
+            self.answer_grader.record_semantic()
+        matrix = await self._answer_matrix(q)
+        user_vec = await self.embedding_batcher.encode(user_answer)
+        scores = matrix @ np.asarray(user_vec, dtype=np.float32)
+        return bool((scores >= self.similarity_threshold).any())
 
 # Singleton instance
 quiz_service = QuizService()
@@ -0,0 +1,316 @@
+"""
+Streaming upload handling: chunked writes, size caps, type sniffing and resumable sessions
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Tuple
+from fastapi import HTTPException, UploadFile
+from src.core.config import settings
+from src.core.database import get_upload_sessions_collection
+from src.services.blob_store import blob_store
+from src.utils.file_processing import FileDigests
+from src.utils.validation_utils import InputValidator
+
+# Leading box types of ISO-BMFF (mp4) and legacy QuickTime (mov) files
+_MOVIE_BOXES = (b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip", b"pnot")
+
+def content_matches_extension(ext: str, head: bytes) -> bool:
+    """Check the first bytes of a file against the signature its extension implies"""
+    if ext == "pdf":
+        return head.startswith(b"%PDF")
+    if ext in ("mp4", "mov"):
+        return head[4:8] in _MOVIE_BOXES
+    if ext == "avi":
+        return head[:4] == b"RIFF" and head[8:12] == b"AVI "
+    if ext == "txt":
+        return b"\x00" not in head
+    return False
+
+async def _rechunk(stream: AsyncIterator[bytes], size: int) -> AsyncIterator[bytes]:
+    """Coalesce an arbitrary byte stream into fixed-size blocks (last one may be short)"""
+    buffer = bytearray()
+    async for data in stream:
+        buffer.extend(data)
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+    if buffer:
+        yield bytes(buffer)
+
+async def _upload_file_chunks(file: UploadFile, size: int) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await file.read(size)
+        if not chunk:
+            break
+        yield chunk
+
+def _write_and_hash(f, hasher, chunk: bytes) -> None:
+    # hashlib releases the GIL on large buffers, so writing and hashing run off the event loop
+    f.write(chunk)
+    hasher.update(chunk)
+
+def _fsync_and_close(f) -> None:
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+def _rehash_prefix(path: Path, length: int) -> FileDigests:
+    """Drop anything past ``length`` (an interrupted part) and rebuild the digests of what remains"""
+    hasher = FileDigests()
+    with open(path, "r+b") as f:
+        f.truncate(length)
+        for chunk in iter(lambda: f.read(settings.UPLOAD_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher
+
+class UploadService:
+    """Writes uploads to disk in fixed-size chunks without blocking the event loop.
+
+    Completed files are handed to the content-addressed blob store.
+    Every upload is validated against ALLOWED_EXTENSIONS, capped at MAX_FILE_SIZE
+    (MAX_VIDEO_FILE_SIZE for videos) while streaming, sniffed for a matching magic
+    signature on its first chunk and hashed (SHA-256) incrementally. Large videos
+    can use resumable sessions: bytes are appended at the confirmed offset, and an
+    interrupted part is simply re-sent from there.
+
+    Incremental hash state for sessions lives in process memory; after a restart
+    it is rebuilt once from the partial file.
+    """
+
+    def __init__(self):
+        self.sessions_collection = get_upload_sessions_collection()
+        self.tmp_dir = Path(settings.UPLOAD_TMP_DIR)
+        self._hashers: Dict[str, FileDigests] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    @staticmethod
+    def validate_filename(filename: Optional[str]) -> Tuple[str, str]:
+        """Return (sanitized filename, extension) or raise 400"""
+        safe_name = InputValidator.sanitize_filename(Path(filename or "").name).strip()
+        if not safe_name or "." not in safe_name:
+            raise HTTPException(status_code=400, detail="Uploaded file must have a name with an extension")
+        if not InputValidator.validate_file_extension(safe_name, settings.ALLOWED_EXTENSIONS):
+            raise HTTPException(
+                status_code=400,
+                detail=f"File type not allowed. Allowed types: {', '.join(settings.ALLOWED_EXTENSIONS)}"
+            )
+        return safe_name, safe_name.lower().rsplit(".", 1)[-1]
+
+    @staticmethod
+    def max_size_for(ext: str) -> int:
+        return settings.MAX_VIDEO_FILE_SIZE if ext in settings.VIDEO_EXTENSIONS else settings.MAX_FILE_SIZE
+
+    @staticmethod
+    def _too_large(limit: int) -> HTTPException:
+        return HTTPException(status_code=413, detail=f"File exceeds the maximum upload size of {limit} bytes")
+
+    async def _write_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        f,
+        hasher,
+        written: int,
+        limit: int,
+        ext: str,
+        sniff: bool
+    ) -> int:
+        """Append chunks to an open file; returns the new total size"""
+        async for chunk in _rechunk(chunks, settings.UPLOAD_CHUNK_SIZE):
+            written += len(chunk)
+            if written > limit:
+                raise self._too_large(limit)
+            if sniff:
+                sniff = False
+                if not content_matches_extension(ext, chunk[:16]):
+                    if ext == "pdf":
+                        raise HTTPException(status_code=400, detail="Uploaded file is not a valid PDF (missing %PDF header). Please export or re-save the document as a PDF and retry.")
+                    raise HTTPException(status_code=400, detail=f"Uploaded file content does not match its .{ext} extension")
+            await asyncio.to_thread(_write_and_hash, f, hasher, chunk)
+        return written
+
+    async def _stored(self, file_path: str, file_name: str, digests: FileDigests, size: int, ext: str) -> dict:
+        """File metadata recorded on the material document at upload time"""
+        st = await asyncio.to_thread((blob_store.uploads_root / file_path).stat)
+        return {
+            "file_path": file_path,
+            "file_name": file_name,
+            "sha256": digests.sha256.hexdigest(),
+            "file_digests": digests.result(size, st.st_mtime),
+            "file_size": size,
+            "file_mtime": st.st_mtime,
+            "file_exists": True,
+            # The first chunk was sniffed for %PDF before anything was stored
+            "pdf_header_valid": True if ext == "pdf" else None
+        }
+
+    async def save_upload_file(self, file: UploadFile, material_id: str) -> dict:
+        """Stream a multipart UploadFile into the blob store"""
+        safe_name, ext = self.validate_filename(file.filename)
+        limit = self.max_size_for(ext)
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.tmp_dir / f"{material_id}.part"
+        hasher = FileDigests()
+
+        f = await asyncio.to_thread(open, tmp_path, "wb")
+        try:
+            size = await self._write_stream(
+                _upload_file_chunks(file, settings.UPLOAD_CHUNK_SIZE), f, hasher, 0, limit, ext, sniff=True
+            )
+            if size == 0:
+                raise HTTPException(status_code=400, detail="Uploaded file is empty")
+            await asyncio.to_thread(_fsync_and_close, f)
+        except BaseException:
+            f.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        sha256 = hasher.sha256.hexdigest()
+        file_path = await blob_store.put(tmp_path, sha256, ext, size)
+        return await self._stored(file_path, safe_name, hasher, size, ext)
+
+    # ---- Resumable sessions ----
+
+    def _session_path(self, upload_id: str) -> Path:
+        return self.tmp_dir / f"{upload_id}.part"
+
+    @staticmethod
+    def _session_view(session: dict) -> dict:
+        return {
+            "upload_id": session["_id"],
+            "filename": session["filename"],
+            "total_size": session["total_size"],
+            "received_bytes": session["received_bytes"],
+            "chunk_size": settings.UPLOAD_CHUNK_SIZE,
+            "expires_at": session["expires_at"]
+        }
+
+    async def create_session(self, user_id: str, filename: str, total_size: int) -> dict:
+        """Start a resumable upload for a file of known size"""
+        safe_name, ext = self.validate_filename(filename)
+        limit = self.max_size_for(ext)
+        if total_size <= 0:
+            raise HTTPException(status_code=400, detail="total_size must be positive")
+        if total_size > limit:
+            raise self._too_large(limit)
+
+        now = datetime.utcnow()
+        session = {
+            "_id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "filename": safe_name,
+            "ext": ext,
+            "total_size": total_size,
+            "received_bytes": 0,
+            "created_at": now,
+            "expires_at": now + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+        }
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(self._session_path(session["_id"]).touch)
+        self._hashers[session["_id"]] = FileDigests()
+        await self.sessions_collection.insert_one(session)
+        return self._session_view(session)
+
+    async def _get_session(self, upload_id: str, user_id: str) -> dict:
+        session = await self.sessions_collection.find_one({"_id": upload_id, "user_id": user_id})
+        if not session:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        return session
+
+    async def _session_lock(self, upload_id: str, user_id: str) -> asyncio.Lock:
+        """Per-session lock, created only for a session that exists (404 otherwise);
+        dropped again by finalize() and _discard()"""
+        await self._get_session(upload_id, user_id)
+        return self._locks.setdefault(upload_id, asyncio.Lock())
+
+    async def get_session(self, upload_id: str, user_id: str) -> dict:
+        """Session state; ``received_bytes`` is the offset to resume from"""
+        return self._session_view(await self._get_session(upload_id, user_id))
+
+    async def append(
+        self,
+        upload_id: str,
+        user_id: str,
+        offset: int,
+        stream: AsyncIterator[bytes],
+        content_length: Optional[int] = None
+    ) -> dict:
+        """Append a part at ``offset``, which must equal the bytes received so far"""
+        async with await self._session_lock(upload_id, user_id):
+            # Re-read under the lock: the previous holder may have finished the session
+            session = await self._get_session(upload_id, user_id)
+            received = session["received_bytes"]
+            if offset != received:
+                raise HTTPException(status_code=409, detail=f"Upload offset mismatch: expected {received}, got {offset}")
+            if content_length is not None and offset + content_length > session["total_size"]:
+                raise self._too_large(session["total_size"])
+
+            path = self._session_path(upload_id)
+            hasher = self._hashers.pop(upload_id, None)
+            if hasher is None:
+                hasher = await asyncio.to_thread(_rehash_prefix, path, received)
+            f = await asyncio.to_thread(open, path, "r+b")
+            try:
+                await asyncio.to_thread(f.seek, received)
+                received = await self._write_stream(
+                    stream, f, hasher, received, session["total_size"], session["ext"], sniff=offset == 0
+                )
+                await asyncio.to_thread(_fsync_and_close, f)
+            except BaseException:
+                # Discard the partial part; the next attempt truncates back to the confirmed offset
+                f.close()
+                raise
+            self._hashers[upload_id] = hasher
+
+            session["received_bytes"] = received
+            session["expires_at"] = datetime.utcnow() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+            await self.sessions_collection.update_one(
+                {"_id": upload_id},
+                {"$set": {"received_bytes": received, "expires_at": session["expires_at"]}}
+            )
+            return self._session_view(session)
+
+    async def finalize(self, upload_id: str, user_id: str) -> dict:
+        """Move a fully received upload into the blob store"""
+        async with await self._session_lock(upload_id, user_id):
+            # Re-read under the lock: the previous holder may have finished the session
+            session = await self._get_session(upload_id, user_id)
+            if session["received_bytes"] != session["total_size"]:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Upload incomplete: {session['received_bytes']} of {session['total_size']} bytes received"
+                )
+            path = self._session_path(upload_id)
+            hasher = self._hashers.pop(upload_id, None)
+            if hasher is None:
+                hasher = await asyncio.to_thread(_rehash_prefix, path, session["total_size"])
+            sha256 = hasher.sha256.hexdigest()
+            file_path = await blob_store.put(path, sha256, session["ext"], session["total_size"])
+            await self.sessions_collection.delete_one({"_id": upload_id})
+        self._locks.pop(upload_id, None)
+        return await self._stored(file_path, session["filename"], hasher, session["total_size"], session["ext"])
+
+    async def abort(self, upload_id: str, user_id: str) -> dict:
+        await self._get_session(upload_id, user_id)
+        await self._discard(upload_id)
+        return {"message": "Upload aborted"}
+
+    async def _discard(self, upload_id: str) -> None:
+        self._hashers.pop(upload_id, None)
+        self._locks.pop(upload_id, None)
+        self._session_path(upload_id).unlink(missing_ok=True)
+        await self.sessions_collection.delete_one({"_id": upload_id})
+
+    async def purge_expired(self) -> int:
+        """Remove sessions (and their partial files) idle past UPLOAD_SESSION_TTL_HOURS"""
+        expired = await self.sessions_collection.find(
+            {"expires_at": {"$lt": datetime.utcnow()}}, {"_id": 1}
+        ).to_list(length=None)
+        for session in expired:
+            await self._discard(session["_id"])
+        return len(expired)
+
+# Singleton instance
+upload_service = UploadService()
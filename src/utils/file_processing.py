@@ -0,0 +1,119 @@
+"""
+CPU/IO-heavy file processing run in worker processes.
+
+Kept free of application imports so spawned workers start quickly.
+"""
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+class FileDigests:
+    """MD5 (diagnostics), SHA-256 (content address) and header bytes in one pass"""
+    
+    HEADER_BYTES = 8
+    
+    def __init__(self):
+        self.sha256 = hashlib.sha256()
+        self.md5 = hashlib.md5(usedforsecurity=False)
+        self.header = b""
+    
+    def update(self, chunk: bytes) -> None:
+        if len(self.header) < self.HEADER_BYTES:
+            self.header += chunk[:self.HEADER_BYTES - len(self.header)]
+        self.sha256.update(chunk)
+        self.md5.update(chunk)
+    
+    def result(self, size: int, mtime: float) -> dict:
+        """Stored as ``file_digests``; valid while the file's size and mtime match"""
+        return {
+            "md5": self.md5.hexdigest(),
+            "sha256": self.sha256.hexdigest(),
+            "header_hex": self.header.hex(),
+            "size": size,
+            "mtime": mtime
+        }
+
+def digest_file(file_abs: str) -> dict:
+    path = Path(file_abs)
+    st = path.stat()
+    digests = FileDigests()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digests.update(chunk)
+    return digests.result(st.st_size, st.st_mtime)
+
+def process_material_file(
+    file_abs: str,
+    is_pdf: bool,
+    thumbnail_abs: Optional[str] = None,
+    compute_hash: bool = True
+) -> dict:
+    """Hash (unless already known), count pages, extract text and render a first-page thumbnail"""
+    path = Path(file_abs)
+    file_digests = digest_file(file_abs) if compute_hash else None
+    result = {
+        "sha256": file_digests["sha256"] if file_digests else None,
+        "file_digests": file_digests,
+        "file_size": path.stat().st_size,
+        "total_pages": None,
+        "text": None,
+        "thumbnail_created": False
+    }
+    
+    if is_pdf:
+        # Page count and text are best effort, as before (PyPDF2 is optional)
+        try:
+            from PyPDF2 import PdfReader  # type: ignore
+            reader = PdfReader(str(path))
+            result["total_pages"] = len(reader.pages)
+            result["text"] = "\n".join(page.extract_text() or "" for page in reader.pages)
+        except Exception:
+            pass
+        if thumbnail_abs:
+            result["thumbnail_created"] = _render_pdf_thumbnail(path, Path(thumbnail_abs))
+    elif path.suffix.lower() == ".txt":
+        result["text"] = path.read_text(encoding="utf-8", errors="ignore")
+    return result
+
+def inspect_file(
+    file_abs: str,
+    is_pdf: bool,
+    known_size: Optional[int] = None,
+    known_mtime: Optional[float] = None,
+    known_header_valid: Optional[bool] = None
+) -> dict:
+    """Existence, size and mtime of a stored file; the PDF header is re-read only
+    when size or mtime differ from the known values"""
+    path = Path(file_abs)
+    try:
+        st = path.stat()
+    except OSError:
+        return {"file_exists": False, "pdf_header_valid": False if is_pdf else None}
+    result = {"file_exists": True, "file_size": st.st_size, "file_mtime": st.st_mtime, "pdf_header_valid": None}
+    if is_pdf:
+        if known_header_valid is not None and known_size == st.st_size and known_mtime == st.st_mtime:
+            result["pdf_header_valid"] = known_header_valid
+        else:
+            try:
+                with open(path, "rb") as f:
+                    result["pdf_header_valid"] = f.read(8).startswith(b"%PDF")
+            except OSError:
+                result["pdf_header_valid"] = False
+    return result
+
+def _render_pdf_thumbnail(pdf_path: Path, thumbnail_path: Path, width: int = 320) -> bool:
+    """Render page 1 as PNG when PyMuPDF is installed; silently skipped otherwise"""
+    try:
+        import fitz  # type: ignore
+    except ImportError:
+        return False
+    try:
+        with fitz.open(str(pdf_path)) as doc:
+            page = doc.load_page(0)
+            zoom = width / page.rect.width
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            thumbnail_path.parent.mkdir(parents=True, exist_ok=True)
+            pixmap.save(str(thumbnail_path))
+        return True
+    except Exception:
+        return False
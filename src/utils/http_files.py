@@ -0,0 +1,184 @@
+"""
+Conditional and ranged file responses (ETag, Last-Modified, If-None-Match, If-Range, Range)
+"""
+import asyncio
+import os
+import secrets
+from email.utils import formatdate, parsedate_to_datetime
+from typing import AsyncIterator, List, Optional, Tuple
+from urllib.parse import quote
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from src.core.config import settings
+
+CHUNK_SIZE = 64 * 1024
+# Beyond this many (merged) ranges the full body is cheaper than the multipart overhead
+MAX_RANGES = 16
+
+def cache_control_for(media_type: str) -> str:
+    """Cache-Control policy for a media type: exact match, then major type ("video/"), then default"""
+    policies = settings.FILE_CACHE_CONTROL
+    return (
+        policies.get(media_type)
+        or policies.get(media_type.split("/", 1)[0] + "/")
+        or policies["default"]
+    )
+
+def _etag_list(header: str) -> List[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+def _weak_match(header: str, etag: str) -> bool:
+    """If-None-Match comparison (weak: W/ prefixes ignored)"""
+    bare = etag.removeprefix("W/")
+    return any(tag == "*" or tag.removeprefix("W/") == bare for tag in _etag_list(header))
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since
+
+def parse_range(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a bytes Range header into sorted, merged inclusive (start, end) pairs.
+
+    Returns None when the header is malformed (serve the full body) and an empty
+    list when no range is satisfiable (416).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        start_s, sep, end_s = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if start_s == "":
+                # Suffix range: last N bytes
+                length = int(end_s)
+                if length <= 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(start_s)
+                end = int(end_s) if end_s else size - 1
+                if end_s and start > end:
+                    return None
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+        if start < size:
+            ranges.append((start, end))
+    ranges.sort()
+    merged: List[Tuple[int, int]] = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+async def _iter_parts(path: str, parts: List[Tuple[bytes, int, int]], trailer: bytes = b"") -> AsyncIterator[bytes]:
+    """Yield (prefix, start, end) segments of a file; reads run in worker threads"""
+    f = await asyncio.to_thread(open, path, "rb")
+    try:
+        for prefix, start, end in parts:
+            if prefix:
+                yield prefix
+            await asyncio.to_thread(f.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        if trailer:
+            yield trailer
+    finally:
+        await asyncio.to_thread(f.close)
+
+def file_response(
+    request: Request,
+    path: str,
+    stat: os.stat_result,
+    media_type: str,
+    etag: str,
+    filename: Optional[str] = None,
+    cache_control: Optional[str] = None
+) -> Response:
+    """Serve a file honouring conditional and Range requests.
+
+    ``etag`` is the unquoted entity tag (e.g. the content SHA-256). Handles
+    If-None-Match / If-Modified-Since (304), If-Range, single ranges (206) and
+    multiple ranges (206 multipart/byteranges); unsatisfiable ranges get 416.
+    """
+    size = stat.st_size
+    etag = f'"{etag}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": cache_control or cache_control_for(media_type),
+        "Accept-Ranges": "bytes",
+    }
+    if filename:
+        headers["Content-Disposition"] = f"inline; filename*=utf-8''{quote(filename)}"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if _weak_match(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif "if-modified-since" in request.headers:
+        if _not_modified_since(request.headers["if-modified-since"], stat.st_mtime):
+            return Response(status_code=304, headers=headers)
+
+    ranges = None
+    range_header = request.headers.get("range")
+    if range_header:
+        if_range = request.headers.get("if-range")
+        # If-Range needs a strong ETag match or the exact Last-Modified date
+        if if_range is None or if_range.strip() in (etag, headers["Last-Modified"]):
+            ranges = parse_range(range_header, size)
+
+    if ranges is None or len(ranges) > MAX_RANGES:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(
+            _iter_parts(path, [(b"", 0, size - 1)]) if size else iter(()),
+            status_code=200, media_type=media_type, headers=headers
+        )
+    if not ranges:
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(status_code=416, headers=headers)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            _iter_parts(path, [(b"", start, end)]),
+            status_code=206, media_type=media_type, headers=headers
+        )
+
+    boundary = secrets.token_hex(16)
+    parts = [
+        (
+            f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n".encode(),
+            start,
+            end
+        )
+        for start, end in ranges
+    ]
+    # Each part after the first is preceded by the CRLF that ends the previous body
+    parts = [parts[0]] + [(b"\r\n" + prefix, start, end) for prefix, start, end in parts[1:]]
+    trailer = f"\r\n--{boundary}--\r\n".encode()
+    headers["Content-Length"] = str(
+        sum(len(prefix) + end - start + 1 for prefix, start, end in parts) + len(trailer)
+    )
+    return StreamingResponse(
+        _iter_parts(path, parts, trailer),
+        status_code=206,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers=headers
+    )